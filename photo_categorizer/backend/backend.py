@@ -1,19 +1,102 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
+import argparse
+import atexit
+import io
+import math
 import os
-import shutil
+import time
 from photo_categorizer.logger import logger
 import threading
 from photo_categorizer.model.model_factory import ModelFactory
 from photo_categorizer.state import StateTypes
 from photo_categorizer.model.BaseModelEngine import BaseModelEngine
-from photo_categorizer.config import BACKEND_PORT, BACKEND_HOST, THRESHOLD, FIXED_CATEGORIES
+from photo_categorizer.model.lifecycle import ModelLifecycle
+from photo_categorizer.config import BACKEND_PORT, BACKEND_HOST, IMAGE_EXTENSIONS, MULTI_LABEL, THRESHOLD, \
+    FIXED_CATEGORIES, CATEGORY_THRESHOLDS, CATEGORY_TREE, EVENT_GAP_HOURS, EVENT_DISTANCE_KM, \
+    EVENT_MERGE_SIMILARITY, EVENT_MERGE_GAP_HOURS, EVENTS_FOLDER, THUMBNAIL_MIN_SIZE, THUMBNAIL_MAX_SIZE
+from photo_categorizer.thumbnails import get_thumbnail_cache
+from photo_categorizer.results import ScoreResult, SELECTION_METHODS, result_path, materialize, load_locations, \
+    save_location
+from photo_categorizer.pipeline import auto_categorize_folder, search_folder, similar_folder, events_folder
+from photo_categorizer.library_index import LibraryIndex, seed_embedding_cache
+from photo_categorizer.jobs import JobJournal
+from photo_categorizer.sources import is_image_source, source_key, open_source, join_location
+from photo_categorizer.hierarchy import ParentEmbeddings
+from photo_categorizer.memory_profile import MemoryProfiler
+from photo_categorizer.result_channel import publish, unpublish
+from photo_categorizer.coordinator import Coordinator
+from photo_categorizer.scheduler import JobScheduler, INTERACTIVE, BULK
+from photo_categorizer.coalesce import SingleFlight, job_key, MEMO, JOINED
+from photo_categorizer.quarantine import load_report, report_path
+import numpy as np
+import requests
 app = Flask(__name__)
 
 model: BaseModelEngine = None  # Lazy initialization
+lifecycle: ModelLifecycle = None  # Warm-up and idle unload of the model
 
 # Dictionary to store status of each folder being processed
 processing_status = {}
 
+# Images skipped as unreadable by the last job of each status key
+skipped_files = {}
+
+# Where the score vector and output folder of each processed folder live; persisted across restarts
+result_locations = load_locations()
+
+# Category folders created by the last auto categorization
+auto_categories = []
+
+# Event folders created by the last events grouping
+event_groups = []
+
+# Image names per category of the last auto categorization, keyed by target folder
+auto_assignments = {}
+
+# Result file -> (mtime_ns, handle) of score results published to the shared-memory channel
+published_results = {}
+# tmpfs holds them in RAM; do not leave them behind when the backend exits
+atexit.register(lambda: unpublish([handle for _, handle in published_results.values()]))
+
+# Memory reports of recent jobs
+memory_profiler = MemoryProfiler()
+
+# Embeddings of the last auto categorized folder, reused when drilling into its categories
+parent_embeddings = {}
+
+# Worker backends encoding shards for this backend; created with the first registered worker
+coordinator: Coordinator = None
+
+# Runs jobs one at a time on the model, interactive ones first; bulk jobs are preempted between batches
+scheduler = JobScheduler()
+
+# Identical auto categorizations and searches share one run, and recent results answer repeats
+single_flight = SingleFlight()
+
+
+def coalesce_key(kind, folder, prompts, thresholds, *extra):
+    """Key of a job for single_flight, or None if the folder cannot be fingerprinted (e.g. not created yet)."""
+    try:
+        return job_key(kind, folder, model.model_id, prompts, thresholds, *extra)
+    except (OSError, ValueError) as e:
+        logger.info(f"Not coalescing {kind} job on {folder}: {e}")
+        return None
+
+
+def abandon_job(key, status_key):
+    """Undo the bookkeeping of a job that could not be started, so identical requests do not wait on it."""
+    processing_status[status_key] = "error"
+    if key is not None:
+        single_flight.finish(key)
+
+
+def load_target(target_folder):
+    """Load a folder into the model, on the registered workers if there are any."""
+    if coordinator is not None and coordinator.live_workers():
+        coordinator.load(model, target_folder)
+    else:
+        model.load_images_from_directory(target_folder)
+
 
 # ----------------- Load Model -----------------
 @app.route('/load-model', methods=['POST'])
@@ -29,10 +112,14 @@ def load_model():
 
 def load_model_async(model_name: str):
     """Run model loading in a separate thread to avoid blocking requests."""
-    global model
+    global model, lifecycle
     try:
         if model is None:
-            model = ModelFactory.get_model(model_name)
+            lifecycle = ModelFactory.get_lifecycle(model_name)
+            if parent_embeddings.clear not in lifecycle.on_unload:
+                lifecycle.on_unload.append(parent_embeddings.clear)  # Large matrices; an idle model drops them
+            model = lifecycle.engine
+            model.batch_hook = lambda: scheduler.yield_point(model)
         logger.info(f"Model successfully loaded: {model_name}")
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
@@ -45,7 +132,8 @@ def model_status():
     if model is None:
         return jsonify({"status": StateTypes.MODEL_LOADING.value})
     else:
-        return jsonify({"status": StateTypes.MODEL_LOADED.value})
+        # An idle-unloaded model still counts as loaded: it reloads on the next request
+        return jsonify({"status": StateTypes.MODEL_LOADED.value, "lifecycle": lifecycle.status()})
 
 
 # ----------------- Load Images -----------------
@@ -59,12 +147,16 @@ def load_images():
     data = request.json
     target_folder = data.get('target_folder')
 
-    if not target_folder or not os.path.isdir(target_folder):
+    if not is_image_source(target_folder):
         return jsonify({"error": "Invalid target folder."}), 400
 
-    # Start image loading
-    model.load_images_from_directory(target_folder)
-    return jsonify({"message": "Images loaded."})
+    # Preloading fills the embedding cache; the engine is left empty, since a bulk job paused
+    # meanwhile restores its own state over it and every job loads its folder again anyway
+    with scheduler.job(INTERACTIVE), lifecycle.in_use():
+        model.load_images_from_directory(target_folder)
+        stats = dict(model.load_stats)
+        model.stash_state()
+    return jsonify({"message": "Images loaded.", **stats})
 
 
 # ----------------- Start Processing -----------------
@@ -80,7 +172,7 @@ def start_process():
     output = data.get('output')
     selected_text = data.get('selected_text')
 
-    if not target_folder or not os.path.isdir(target_folder):
+    if not is_image_source(target_folder):
         return jsonify({"error": "Invalid target folder."}), 400
     if not output or 'folder_name' not in output or 'prompt' not in output:
         return jsonify({"error": "Invalid output data."}), 400
@@ -89,63 +181,152 @@ def start_process():
     prompt = output['prompt']
     selected_text_folder_name = selected_text + "_" + folder_name
 
+    source_dir = join_location(open_source(target_folder).output_root, selected_text)
+    key = coalesce_key("search", source_dir, [prompt], THRESHOLD, folder_name)
+    state, memo = single_flight.begin(key) if key is not None else (None, None)
+    if state == MEMO:
+        remember_result(selected_text_folder_name, memo)
+        processing_status[selected_text_folder_name] = "completed"
+        return jsonify({"message": f"Results for {folder_name} are up to date.", "coalesced": state})
+    if state == JOINED:
+        return jsonify({"message": f"Processing already running for {folder_name}.", "coalesced": state})
+
     # Set status to "processing"
     processing_status[selected_text_folder_name] = "processing"
     logger.info(f"Started processing for {selected_text_folder_name} with prompt: {prompt}")
 
-    # Start actual processing in a separate thread
-    threading.Thread(
-        target=process_images_async,
-        args=(target_folder, selected_text, folder_name, prompt),
-        daemon=True
-    ).start()
+    try:
+        journal = JobJournal.create("search", selected_text_folder_name, {
+            "target_folder": target_folder, "selected_text": selected_text,
+            "output_folder": folder_name, "prompt": prompt})
+
+        # Start actual processing in a separate thread
+        threading.Thread(
+            target=process_images_async,
+            args=(target_folder, selected_text, folder_name, prompt, journal, key),
+            daemon=True
+        ).start()
+    except Exception:
+        abandon_job(key, selected_text_folder_name)
+        raise
 
     return jsonify({"message": f"Processing started for {folder_name}."})
 
 
-def process_images_async(target_folder, selected_text, output_folder, prompt):
-    """Process images and move matches to output folder."""
+def process_images_async(target_folder, selected_text, output_folder, prompt, journal=None, key=None):
+    """Process images and move matches to output folder; key ends the single_flight run."""
     global model, processing_status
     selected_text_folder_name = selected_text + "_" + output_folder
+    with scheduler.job(INTERACTIVE):
+        profile = memory_profiler.start_job("search", selected_text_folder_name)
+        location = None
+        try:
+            lifecycle.acquire()
+            path_new, output_path, _ = search_folder(model, target_folder, selected_text, output_folder, prompt,
+                                                     journal=journal,
+                                                     parent=parent_embeddings.get(source_key(target_folder)))
+            location = (path_new, output_path)
+            remember_result(selected_text_folder_name, location)
+
+            # Mark processing as completed
+            processing_status[selected_text_folder_name] = "completed"
+            logger.info(f"Completed processing for {output_folder}")
+
+        except Exception as e:
+            logger.error(f"Failed to process {output_folder}: {e}")
+            processing_status[selected_text_folder_name] = "error"
+            if journal is not None:
+                journal.update(phase="error")
+
+        finally:
+            skipped_files[selected_text_folder_name] = model.load_stats["skipped"]
+            model.clean_memory()
+            lifecycle.release()
+            memory_profiler.finish_job(profile)
+            if key is not None:
+                single_flight.finish(key, location, [location[1]] if location else ())
+            logger.info(f"loaded image for {target_folder} cleaned")
+
+
+@app.route('/search-similar', methods=['POST'])
+def search_similar():
+    """API to find images similar to example images, optionally blended with a text prompt."""
+    global model
+    if model is None:
+        return jsonify({"error": "Model is not loaded. Please load the model first."}), 400
+
+    data = request.json
+    target_folder = data.get('target_folder')
+    output_folder = data.get('output_folder')
+    examples = data.get('examples') or []
+    text = data.get('prompt')
+
+    if not is_image_source(target_folder):
+        return jsonify({"error": "Invalid target folder."}), 400
+    if not output_folder:
+        return jsonify({"error": "Output folder is required."}), 400
+    if not examples and not text:
+        return jsonify({"error": "At least one example image or a prompt is required."}), 400
+    missing = [path for path in examples if not os.path.isfile(path)]
+    if missing:
+        return jsonify({"error": f"Example images not found: {missing}"}), 400
+
     try:
-        selected_text_folder_name = selected_text + "_" + output_folder
-        output_path = os.sep.join([target_folder, selected_text, output_folder])
-        os.makedirs(output_path, exist_ok=True)
-
-        path_new = os.sep.join([target_folder, selected_text])
-        model.load_images_from_directory(path_new)
-        logger.info(f"Loading images from '{path_new}'")
-        # Search images based on prompt
-        logger.info(f"Running search for prompt '{prompt}' into '{output_path}'")
-        results = model.search_images(
-            prompt=prompt
-        )
-
-        # Copy matching images (customize this logic as needed)
-        for image_name, score in results:
-            if score > THRESHOLD:
-                src = os.path.join(target_folder, selected_text, image_name)
-                dst = os.path.join(output_path, image_name)
-                shutil.copy(src, dst)
-                logger.info(f"Copied {image_name} with score {score}")
-
-        # Mark processing as completed
-        processing_status[selected_text_folder_name] = "completed"
-        logger.info(f"Completed processing for {output_folder}")
+        options = {
+            "image_weight": float(data.get('image_weight', 1.0)),
+            "text_weight": float(data.get('text_weight', 1.0)),
+            "top_k": int(data.get('top_k', 50)),
+        }
+    except (TypeError, ValueError):
+        return jsonify({"error": "Weights and top_k must be numbers."}), 400
+
+    status_key = "similar_" + output_folder
+    processing_status[status_key] = "processing"
+    logger.info(f"Started similarity search for {status_key}")
+
+    journal = JobJournal.create("similar", status_key, {
+        "target_folder": target_folder, "output_folder": output_folder,
+        "examples": examples, "prompt": text, "options": options})
 
-    except Exception as e:
-        logger.error(f"Failed to process {output_folder}: {e}")
-        processing_status[selected_text_folder_name] = "error"
+    threading.Thread(
+        target=search_similar_async,
+        args=(status_key, target_folder, output_folder, examples, text, options, journal),
+        daemon=True
+    ).start()
 
-    finally:
-        model.clean_memory()
-        logger.info(f"loaded image for {target_folder} cleaned")
+    return jsonify({"message": f"Similarity search started for {output_folder}.", "folder": status_key})
+
+
+def search_similar_async(status_key, target_folder, output_folder, examples, text, options, journal=None):
+    """Run a similarity search and copy the top matches to the output folder."""
+    global model, processing_status
+    with scheduler.job(INTERACTIVE):
+        profile = memory_profiler.start_job("similar", status_key)
+        try:
+            lifecycle.acquire()
+            source_dir, output_path, _ = similar_folder(model, target_folder, output_folder, examples, text,
+                                                        journal=journal, **options)
+            remember_result(status_key, (source_dir, output_path))
+            processing_status[status_key] = "completed"
+            logger.info(f"Completed similarity search for {output_folder}")
+
+        except Exception as e:
+            logger.error(f"Failed similarity search for {output_folder}: {e}")
+            processing_status[status_key] = "error"
+            if journal is not None:
+                journal.update(phase="error")
+
+        finally:
+            skipped_files[status_key] = model.load_stats["skipped"]
+            model.clean_memory()
+            lifecycle.release()
+            memory_profiler.finish_job(profile)
 
 
 @app.route('/auto-categorize', methods=['POST'])
 def auto_categorize():
     """API to start processing one output folder with a given prompt."""
-    global model
+    global model, auto_categories
     if model is None:
         return jsonify({"error": "Model is not loaded. Please load the model first."}), 400
 
@@ -153,56 +334,283 @@ def auto_categorize():
     data = request.json
     target_folder = data.get('target_folder')
 
-    if not target_folder or not os.path.isdir(target_folder):
+    if not is_image_source(target_folder):
         return jsonify({"error": "Invalid target folder."}), 400
 
-    model.load_images_from_directory(target_folder)
+    multi_label = bool(data.get('multi_label', MULTI_LABEL))
 
-    processing_status["auto"] = "processing"
-    logger.info(f"Started processing for auto categorizer")
+    key = coalesce_key("auto", target_folder, {"categories": FIXED_CATEGORIES, "tree": CATEGORY_TREE},
+                       {"default": THRESHOLD, "categories": CATEGORY_THRESHOLDS}, multi_label)
+    state, memo = single_flight.begin(key) if key is not None else (None, None)
+    if state == MEMO:
+        auto_categories, auto_assignments[source_key(target_folder)] = memo
+        processing_status["auto"] = "completed"
+        return jsonify({"message": "Auto categorization is up to date.", "coalesced": state})
+    if state == JOINED:
+        return jsonify({"message": "Auto categorization already running for this folder.", "coalesced": state})
 
-    # Start actual processing in a separate thread
-    threading.Thread(
-        target=auto_categorize_async,
-        args=(target_folder,),
-        daemon=True
-    ).start()
+    processing_status["auto"] = "processing"
+    try:
+        journal = JobJournal.create("auto", "auto", {"target_folder": target_folder, "multi_label": multi_label})
+        logger.info(f"Started processing for auto categorizer")
+
+        # Start actual processing in a separate thread; it loads the images once the scheduler runs it
+        threading.Thread(
+            target=auto_categorize_async,
+            args=(target_folder, journal, multi_label, True, key),
+            daemon=True
+        ).start()
+    except Exception:
+        abandon_job(key, "auto")
+        raise
 
     return jsonify({"message": f"Processing started for auto categorizer."})
 
 
-def auto_categorize_async(target_folder):
-    """Process images and move matches to output folder."""
-    global model, processing_status
+def auto_categorize_async(target_folder, journal=None, multi_label=MULTI_LABEL, load=True, key=None):
+    """
+    Load images (unless resuming from stored assignments), process them and move matches
+    to output folders; key ends the single_flight run.
+    """
+    global model, processing_status, auto_categories
+    with scheduler.job(BULK):
+        profile = memory_profiler.start_job("auto", target_folder)
+        outcome, outputs = None, ()
+        try:
+            lifecycle.acquire()
+            if load:
+                if journal is not None:
+                    journal.update(phase="encoding")
+                profile.mark("encoding")
+                load_target(target_folder)
+            auto_categories, results = auto_categorize_folder(model, target_folder, journal=journal,
+                                                              multi_label=multi_label)
+            auto_assignments[source_key(target_folder)] = {k: list(v) for k, v in results.items()}
+            if model.image_names:
+                # Only the last folder is kept, its matrix can be large
+                parent_embeddings.clear()
+                parent_embeddings[source_key(target_folder)] = ParentEmbeddings(
+                    target_folder, model.image_names, model.image_embeddings, results)
+
+            outcome = (auto_categories, auto_assignments[source_key(target_folder)])
+            output_root = open_source(target_folder).output_root
+            outputs = [join_location(output_root, category) for category, names in results.items() if names]
+
+            # Mark processing as completed
+            processing_status["auto"] = "completed"
+            logger.info(f"Completed processing for {target_folder}")
+
+        except Exception as e:
+            logger.error(f"Failed to process {target_folder}: {e}")
+            processing_status["auto"] = "error"
+            if journal is not None:
+                journal.update(phase="error")
+
+        finally:
+            skipped_files["auto"] = model.load_stats["skipped"]
+            model.clean_memory()
+            lifecycle.release()
+            memory_profiler.finish_job(profile)
+            if key is not None:
+                single_flight.finish(key, outcome, outputs)
+            logger.info(f"loaded image for auto categorizer cleaned")
+
+@app.route('/group-events', methods=['POST'])
+def group_events():
+    """API to group a folder into event folders by capture time, place and visual similarity."""
+    global model, event_groups
+    if model is None:
+        return jsonify({"error": "Model is not loaded. Please load the model first."}), 400
+
+    data = request.json
+    target_folder = data.get('target_folder')
+
+    if not is_image_source(target_folder):
+        return jsonify({"error": "Invalid target folder."}), 400
+
+    key = coalesce_key("events", target_folder, [],
+                       [EVENT_GAP_HOURS, EVENT_DISTANCE_KM, EVENT_MERGE_SIMILARITY, EVENT_MERGE_GAP_HOURS])
+    state, memo = single_flight.begin(key) if key is not None else (None, None)
+    if state == MEMO:
+        event_groups = memo
+        processing_status["events"] = "completed"
+        return jsonify({"message": "Events are up to date.", "coalesced": state})
+    if state == JOINED:
+        return jsonify({"message": "Event grouping already running for this folder.", "coalesced": state})
+
+    processing_status["events"] = "processing"
     try:
-        for output_folder in FIXED_CATEGORIES + ["other"]:
-            output_path = os.path.join(target_folder, output_folder)
-            os.makedirs(output_path, exist_ok=True)
+        journal = JobJournal.create("events", "events", {"target_folder": target_folder})
+        threading.Thread(target=group_events_async, args=(target_folder, journal, key), daemon=True).start()
+    except Exception:
+        abandon_job(key, "events")
+        raise
+    return jsonify({"message": f"Event grouping started for {target_folder}."})
+
+
+def group_events_async(target_folder, journal=None, key=None):
+    """Load images and copy them into one folder per event."""
+    global model, processing_status, event_groups
+    with scheduler.job(BULK):
+        profile = memory_profiler.start_job("events", target_folder)
+        outcome, outputs = None, ()
+        try:
+            lifecycle.acquire()
+            if journal is not None:
+                journal.update(phase="encoding")
+            profile.mark("encoding")
+            load_target(target_folder)
+            event_groups, _ = events_folder(model, target_folder, journal=journal)
+            outcome = event_groups
+            events_root = join_location(open_source(target_folder).output_root, EVENTS_FOLDER)
+            outputs = [join_location(events_root, event) for event in event_groups]
+            processing_status["events"] = "completed"
+            logger.info(f"Completed event grouping for {target_folder}")
+
+        except Exception as e:
+            logger.error(f"Failed to group events of {target_folder}: {e}")
+            processing_status["events"] = "error"
+            if journal is not None:
+                journal.update(phase="error")
+
+        finally:
+            skipped_files["events"] = model.load_stats["skipped"]
+            model.clean_memory()
+            lifecycle.release()
+            memory_profiler.finish_job(profile)
+            if key is not None:
+                single_flight.finish(key, outcome, outputs)
+
+# ----------------- Resumable Jobs -----------------
+@app.route('/jobs', methods=['GET'])
+def jobs():
+    """API to list journaled jobs; unfinished ones can be resumed."""
+    unfinished_only = request.args.get('unfinished', 'false').lower() == 'true'
+    journals = JobJournal.unfinished() if unfinished_only else JobJournal.all()
+    return jsonify({"jobs": [journal.summary() for journal in journals]})
+
+
+@app.route('/resume', methods=['POST'])
+def resume():
+    """API to resume unfinished jobs (or one job by id) from their last checkpoint."""
+    global model
+    if model is None:
+        return jsonify({"error": "Model is not loaded. Please load the model first."}), 400
 
-        # Search images based on prompt
-        logger.info(f"Running auto categorizer for {target_folder}")
-        results = model.auto_categorize_image()
+    data = request.json or {}
+    job_id = data.get('job_id')
+    # Failed jobs are only retried when asked for by id, and only JOB_MAX_ATTEMPTS times
+    journals = [j for j in JobJournal.unfinished(include_failed=bool(job_id)) if not job_id or j.job_id == job_id]
+    journals = [j for j in journals if processing_status.get(j.status_key) != "processing"]
+    if job_id and not journals:
+        return jsonify({"error": f"No resumable job {job_id}."}), 404
+
+    for journal in journals:
+        processing_status[journal.status_key] = "processing"
+        journal.update(attempts=journal.attempts + 1)
+    threading.Thread(target=resume_jobs_async, args=(journals,), daemon=True).start()
+
+    return jsonify({"message": f"Resuming {len(journals)} jobs.", "jobs": [j.summary() for j in journals]})
+
+
+def resume_jobs_async(journals):
+    """Resume jobs one after another; embeddings already checkpointed are not encoded again."""
+    for journal in journals:
+        params = journal.params
+        logger.info(f"Resuming {journal.kind} job {journal.job_id} from phase {journal.phase}")
+        if journal.kind == "auto":
+            auto_categorize_async(params["target_folder"], journal, params.get("multi_label", False),
+                                  load=journal.assignments is None)
+        elif journal.kind == "events":
+            group_events_async(params["target_folder"], journal)
+        elif journal.kind == "search":
+            process_images_async(params["target_folder"], params["selected_text"], params["output_folder"],
+                                 params["prompt"], journal)
+        elif journal.kind == "similar":
+            search_similar_async(journal.status_key, params["target_folder"], params["output_folder"],
+                                 params["examples"], params["prompt"], params["options"], journal)
+
+
+# ----------------- Coordinator -----------------
+@app.route('/workers', methods=['GET', 'POST', 'DELETE'])
+def workers():
+    """API to list, register (loading the model on them) or remove worker backends."""
+    global coordinator
+    if request.method == 'GET':
+        return jsonify(coordinator.status() if coordinator is not None else {"workers": {}})
+    if model is None:
+        return jsonify({"error": "Model is not loaded. Please load the model first."}), 400
 
+    data = request.json or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({"error": "Worker URL is required."}), 400
+    if request.method == 'DELETE':
+        removed = coordinator is not None and coordinator.remove_worker(url)
+        return jsonify({"removed": removed})
 
-        # Copy matching images (customize this logic as needed)
+    if coordinator is None:
+        coordinator = Coordinator(model.model_id)
+    try:
+        url = coordinator.register(url, data.get('model', model.model_id))
+    except (requests.RequestException, RuntimeError) as e:
+        return jsonify({"error": f"Could not register {url}: {e}"}), 400
+    return jsonify({"message": f"Registered {url}.", "workers": coordinator.status()["workers"]})
 
-        for k, v in results.items():
-            for image_name in v:
-                src = os.path.join(target_folder, image_name)
-                dst = os.path.join(os.path.join(target_folder, str(k)), image_name)
-                shutil.copy(src, dst)
 
-        # Mark processing as completed
-        processing_status["auto"] = "completed"
-        logger.info(f"Completed processing for {target_folder}")
+@app.route('/encode-shard', methods=['POST'])
+def encode_shard():
+    """API for coordinators: encode some images of a folder and return their embeddings as an NPZ file."""
+    global model
+    if model is None:
+        return jsonify({"error": "Model is not loaded. Please load the model first."}), 400
 
-    except Exception as e:
-        logger.error(f"Failed to process {target_folder}: {e}")
-        processing_status["auto"] = "error"
+    data = request.json
+    target_folder = data.get('target_folder')
+    names = data.get('names')
+
+    if not is_image_source(target_folder):
+        return jsonify({"error": "Invalid target folder."}), 400
+    if not isinstance(names, list):
+        return jsonify({"error": "A list of image names is required."}), 400
+
+    # A stale or partial mount must fail the shard, so the coordinator retries it elsewhere
+    missing = set(names) - {name for name, _, _ in open_source(target_folder).list_files()}
+    if missing:
+        return jsonify({"error": f"{len(missing)} images not found on this worker, e.g. {min(missing)}."}), 409
+
+    buffer = io.BytesIO()
+    with scheduler.job(BULK), lifecycle.in_use():
+        try:
+            model.load_images_from_directory(target_folder, names=names)
+            embeddings = model.image_embeddings if model.image_names else np.zeros((0, 0), dtype=np.float32)
+            # Images not loaded were quarantined here, now or by an earlier load; the coordinator records them too
+            report = load_report(target_folder)
+            skipped = sorted(set(names) - set(model.image_names))
+            reasons = [report.get(name, {}).get("reason", "not loaded on worker") for name in skipped]
+            transient = [name not in report or "retry_after" in report[name] for name in skipped]
+            np.savez(buffer, model_id=np.array(model.model_id), names=np.array(model.image_names, dtype=str),
+                     embeddings=embeddings, skipped=np.array(skipped, dtype=str),
+                     reasons=np.array(reasons, dtype=str), transient=np.array(transient, dtype=bool))
+        finally:
+            model.clean_memory()
+    buffer.seek(0)
+    return send_file(buffer, mimetype="application/octet-stream")
+
+
+# ----------------- Scheduling -----------------
+@app.route('/scheduler', methods=['GET'])
+def scheduler_status():
+    """API to get running and waiting jobs, preemptions, latency percentiles per priority class and coalescing."""
+    return jsonify({**scheduler.status(), "coalescing": single_flight.status()})
+
+
+# ----------------- Memory Profiling -----------------
+@app.route('/memory-profile', methods=['GET'])
+def memory_profile():
+    """API to get RSS, allocator stats and per-phase memory of recent jobs."""
+    return jsonify(memory_profiler.status())
 
-    finally:
-        model.clean_memory()
-        logger.info(f"loaded image for auto categorizer cleaned")
 
 # ----------------- Processing Status -----------------
 @app.route('/process-status', methods=['GET'])
@@ -214,13 +622,240 @@ def process_status():
 
     status = processing_status.get(folder_name, "not_started")
     logger.info(f"Status check for {folder_name}: {status}")
-    return jsonify({"status": status})
+    response = {"status": status, "skipped": skipped_files.get(folder_name, 0)}
+    if folder_name == "auto" and status == "completed":
+        response["categories"] = auto_categories
+    if folder_name == "events" and status == "completed":
+        response["categories"] = event_groups
+    return jsonify(response)
+
+
+@app.route('/quarantine', methods=['GET'])
+def quarantine():
+    """API to list the images of a folder that were skipped as unreadable, with the reason."""
+    target_folder = request.args.get('target_folder')
+    if not is_image_source(target_folder):
+        return jsonify({"error": "Invalid target folder."}), 400
+    return jsonify({"report": report_path(target_folder), "files": load_report(target_folder)})
+
+
+# ----------------- Results -----------------
+def remember_result(folder_name, location):
+    result_locations[folder_name] = location
+    try:
+        save_location(folder_name, *location)
+    except OSError as e:
+        logger.warning(f"Could not persist the result location of {folder_name}: {e}")
+
+
+def load_result(folder_name):
+    """Return (source_dir, output_path, ScoreResult) for a processed folder, or None."""
+    location = result_locations.get(folder_name) or load_locations().get(folder_name)
+    if location is None or not os.path.exists(result_path(location[1])):
+        return None
+    source_dir, output_path = location
+    return source_dir, output_path, ScoreResult.load(result_path(output_path))
+
+
+@app.route('/results', methods=['GET'])
+def results_summary():
+    """API to get the score distribution of a processed folder."""
+    folder_name = request.args.get('folder')
+    if not folder_name:
+        return jsonify({"error": "Folder name is required."}), 400
 
+    loaded = load_result(folder_name)
+    if loaded is None:
+        return jsonify({"error": f"No results for {folder_name}."}), 404
+
+    _, _, result = loaded
+    summary = result.summary()
+    top_k = request.args.get('top_k', type=int)
+    if top_k:
+        scores = dict(zip(result.image_names, result.scores.tolist()))
+        summary["top"] = [{"name": name, "score": scores[name]} for name in result.select("top_k", top_k)]
+    return jsonify(summary)
+
+
+@app.route('/result-channel', methods=['GET'])
+def result_channel():
+    """
+    API to publish the full score result of a processed folder to the shared-memory channel.
+    Only a small handle goes over HTTP; the GUI memory maps the arrays it points to.
+    """
+    folder_name = request.args.get('folder')
+    output_path = request.args.get('path')
+    if folder_name:
+        location = result_locations.get(folder_name)
+    elif output_path:
+        location = next((loc for loc in result_locations.values() if loc[1] == output_path),
+                        (os.path.dirname(output_path), output_path))  # Search outputs sit in their source
+    else:
+        return jsonify({"error": "Folder name or output path is required."}), 400
+    if location is None or not os.path.exists(result_path(location[1])):
+        return jsonify({"error": f"No results for {folder_name or output_path}."}), 404
+
+    source_dir, output_path = location
+    stored = result_path(output_path)
+    mtime = os.stat(stored).st_mtime_ns
+    cached = published_results.get(stored)
+    if cached is None or cached[0] != mtime or not os.path.isdir(cached[1]["path"]):
+        try:
+            handle = publish(output_path, ScoreResult.load(stored), source_dir)
+        except OSError as e:
+            logger.error(f"Could not publish {output_path} to the result channel: {e}")
+            return jsonify({"error": f"Result channel unavailable: {e}"}), 503
+        published_results[stored] = (mtime, handle)
+    return jsonify(published_results[stored][1])
+
+
+@app.route('/apply-selection', methods=['POST'])
+def apply_selection():
+    """API to re-materialize an output folder from stored scores with a new cutoff."""
+    data = request.json
+    folder_name = data.get('folder')
+    method = data.get('method', 'threshold')
+    value = data.get('value')
+
+    if method not in SELECTION_METHODS:
+        return jsonify({"error": f"Method must be one of {SELECTION_METHODS}."}), 400
+    if value is None and method in ("threshold", "top_k", "percentile"):
+        return jsonify({"error": f"A value is required for {method}."}), 400
+    if value is not None:
+        try:
+            number = int(value) if method == "top_k" else float(value)
+        except (TypeError, ValueError, OverflowError):
+            number = None
+        if number is None or isinstance(value, bool) or not math.isfinite(number) or \
+                method == "top_k" and number < 0 or method == "percentile" and not 0 <= number <= 100 or \
+                method == "gap" and not 0 < number <= 1:
+            return jsonify({"error": f"Invalid value for {method}: {value!r}."}), 400
+        value = number
+
+    loaded = load_result(folder_name)
+    if loaded is None:
+        return jsonify({"error": f"No results for {folder_name}."}), 404
+
+    source_dir, output_path, result = loaded
+    start = time.perf_counter()
+    selected = result.select(method, value)
+    added, removed = materialize(source_dir, output_path, selected, previous=result.selected)
+    result.selected = selected
+    result.save(result_path(output_path))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    logger.info(f"Applied {method}={value} to {folder_name} in {elapsed_ms:.1f} ms")
+    return jsonify({"selected": len(selected), "added": added, "removed": removed, "elapsed_ms": elapsed_ms})
+
+
+# ----------------- Library Index -----------------
+@app.route('/export-index', methods=['POST'])
+def export_index():
+    """API to export embeddings, scores and categories of a folder as a library index."""
+    global model
+    if model is None:
+        return jsonify({"error": "Model is not loaded. Please load the model first."}), 400
+
+    data = request.json
+    target_folder = data.get('target_folder')
+    index_path = data.get('index_path')
+
+    if not is_image_source(target_folder):
+        return jsonify({"error": "Invalid target folder."}), 400
+    if not index_path:
+        return jsonify({"error": "Index path is required."}), 400
+
+    processing_status["export"] = "processing"
+    threading.Thread(target=export_index_async, args=(target_folder, index_path), daemon=True).start()
+    return jsonify({"message": f"Export started for {target_folder}."})
+
+
+def export_index_async(target_folder, index_path):
+    """Load (mostly from the embedding cache) and export one folder."""
+    global model, processing_status
+    with scheduler.job(BULK):
+        profile = memory_profiler.start_job("export", target_folder)
+        try:
+            lifecycle.acquire()
+            profile.mark("encoding")
+            model.load_images_from_directory(target_folder)
+            categories = auto_assignments.get(source_key(target_folder))
+            model.export_index(index_path, target_folder, categories)
+            processing_status["export"] = "completed"
+        except Exception as e:
+            logger.error(f"Failed to export index for {target_folder}: {e}")
+            processing_status["export"] = "error"
+        finally:
+            skipped_files["export"] = model.load_stats["skipped"]
+            model.clean_memory()
+            lifecycle.release()
+            memory_profiler.finish_job(profile)
+
+
+@app.route('/import-index', methods=['POST'])
+def import_index():
+    """API to seed the embedding cache of a folder from a library index, so it needs no encoding."""
+    global model
+    if model is None:
+        return jsonify({"error": "Model is not loaded. Please load the model first."}), 400
+    if model.embedding_cache is None:
+        return jsonify({"error": "The embedding cache is disabled."}), 400
+
+    data = request.json
+    target_folder = data.get('target_folder')
+    index_path = data.get('index_path')
+
+    if not is_image_source(target_folder):
+        return jsonify({"error": "Invalid target folder."}), 400
+    if not index_path or not os.path.isfile(os.path.join(index_path, "manifest.json")):
+        return jsonify({"error": "Invalid index path."}), 400
+
+    try:
+        index = LibraryIndex.load(index_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if index.model_id != model.model_id:
+        return jsonify({"error": f"Index was built with {index.model_id}, not {model.model_id}."}), 400
+
+    seeded = seed_embedding_cache(index, model.embedding_cache, target_folder)
+    if index.categories:
+        auto_assignments[source_key(target_folder)] = index.categories
+    return jsonify({"message": f"Imported {seeded} of {len(index.files)} images.", "imported": seeded,
+                    "categories": list(index.categories.keys())})
+
+
+# ----------------- Thumbnails -----------------
+@app.route('/thumbnail', methods=['GET'])
+def thumbnail():
+    """API to serve a cached thumbnail for one image."""
+    image_path = request.args.get('path')
+    size = request.args.get('size', type=int)
+
+    if not image_path or not os.path.isfile(image_path):
+        return jsonify({"error": "Invalid image path."}), 400
+    if os.path.splitext(image_path)[1].lower() not in IMAGE_EXTENSIONS:
+        return jsonify({"error": "Unsupported image type."}), 400
+    if 'size' in request.args:
+        if size is None or size <= 0:
+            return jsonify({"error": "Size must be a positive integer."}), 400
+        size = min(max(size, THUMBNAIL_MIN_SIZE), THUMBNAIL_MAX_SIZE)
+
+    try:
+        thumbnail_path = get_thumbnail_cache().get_or_create(image_path, size)
+    except Exception as e:
+        logger.error(f"Failed to create thumbnail for {image_path}: {e}")
+        return jsonify({"error": "Failed to create thumbnail."}), 500
 
+    # Thumbnails are keyed by mtime, so clients may cache them aggressively
+    return send_file(thumbnail_path, mimetype="image/jpeg", max_age=86400)
 
 
 # ----------------- Run App -----------------
 if __name__ == '__main__':
-    logger.info(f"Starting backend on {BACKEND_HOST}:{BACKEND_PORT}...")
+    parser = argparse.ArgumentParser(description="Photo categorizer backend.")
+    parser.add_argument("--host", default=BACKEND_HOST)
+    parser.add_argument("--port", type=int, default=BACKEND_PORT, help="several backends can run as workers")
+    args = parser.parse_args()
+    logger.info(f"Starting backend on {args.host}:{args.port}...")
     logger.info("Initializing Flask backend...")
-    app.run(debug=False, host=BACKEND_HOST, port=BACKEND_PORT)
+    app.run(debug=False, host=args.host, port=args.port)
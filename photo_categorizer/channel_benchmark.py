@@ -0,0 +1,119 @@
+"""
+Benchmark of the shared-memory result channel against JSON over HTTP.
+
+Serves a synthetic score result from a local HTTP server in two ways: the full
+result as JSON (what a Flask endpoint would return), and the channel handle
+(published on every request, the worst case since the backend reuses a published
+result, then memory mapped). The GUI-side time includes the request and
+everything needed before a cutoff can be applied:
+
+    python -m photo_categorizer.channel_benchmark --rows 100000
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from photo_categorizer.config import THRESHOLD
+from photo_categorizer.result_channel import publish, SharedResult
+from photo_categorizer.results import ScoreResult
+
+
+def make_result(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    names = [f"IMG_{i:07d}.jpg" for i in range(rows)]
+    result = ScoreResult("a photo of a dog", names, rng.normal(20, 4, rows))
+    result.selected = result.select("threshold", THRESHOLD)
+    return result
+
+
+def serve(result, channel_dir):
+    """Start a local server answering /json with the full result and /handle with a channel handle."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/json":
+                body = json.dumps({"prompt": result.prompt, "image_names": result.image_names,
+                                   "scores": result.scores.tolist(), "selected": result.selected})
+            else:
+                body = json.dumps(publish("benchmark", result, "/library", channel_dir))
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+
+def run_json(base_url):
+    start = time.perf_counter()
+    payload = fetch(base_url + "/json")
+    data = json.loads(payload)
+    scores = np.asarray(data["scores"], dtype=np.float32)
+    count = int(np.count_nonzero(scores > THRESHOLD))
+    return time.perf_counter() - start, len(payload), count
+
+
+def run_channel(base_url):
+    start = time.perf_counter()
+    payload = fetch(base_url + "/handle")
+    shared = SharedResult(json.loads(payload))
+    count = shared.count_above(THRESHOLD)
+    shared.names_above(THRESHOLD, limit=200)  # First page of a preview grid
+    shared.close()
+    return time.perf_counter() - start, len(payload), count
+
+
+def benchmark(rows=100000, repeats=5):
+    result = make_result(rows)
+    channel_dir = tempfile.mkdtemp(prefix="photo_channel_")
+    server = serve(result, channel_dir)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        report = {}
+        for name, run in (("json", run_json), ("channel", run_channel)):
+            run(base_url)  # Warm-up
+            timings = [run(base_url) for _ in range(repeats)]
+            report[name] = {"median_ms": statistics.median(t[0] for t in timings) * 1000,
+                            "http_bytes": timings[0][1], "above_threshold": timings[0][2]}
+        return report
+    finally:
+        server.shutdown()
+        shutil.rmtree(channel_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="photo_categorizer.channel_benchmark", description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.rows, args.repeats)
+    for name, stats in report.items():
+        print(f"{name:8s} {stats['median_ms']:8.1f} ms  {stats['http_bytes']:>10,d} bytes over HTTP  "
+              f"({stats['above_threshold']} above {THRESHOLD})")
+    print(f"speed-up: {report['json']['median_ms'] / report['channel']['median_ms']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Headless batch categorization.
+
+Runs the model engine in-process, without the GUI or the Flask backend, and
+produces the same folder layout as the backend jobs.
+
+    photo-categorizer --workers 8 auto ~/Photos/2024 ~/Photos/2025
+    photo-categorizer search ~/Photos/2024 --category pets --output "dogs=a photo of a dog"
+    photo-categorizer events ~/Photos/2024
+    photo-categorizer index ~/Pictures --watch
+    photo-categorizer --remote http://10.0.0.2:5050 --remote http://10.0.0.3:5050 auto /mnt/photos
+"""
+
+import argparse
+import sys
+import time
+
+from photo_categorizer.config import LOADER_WORKERS, THRESHOLD, AUTOTUNE, MULTI_LABEL, LIBRARY_ROOTS, INDEXER_THREADS
+from photo_categorizer.coordinator import Coordinator
+from photo_categorizer.indexer import LibraryIndexer, lower_priority
+from photo_categorizer.logger import logger
+from photo_categorizer.model.autotune import autotune
+from photo_categorizer.model.BaseModelEngine import new_load_stats
+from photo_categorizer.model.embedding_cache import EmbeddingCache
+from photo_categorizer.model.model_factory import ModelFactory
+from photo_categorizer.model.model_types import ModelTypes
+from photo_categorizer.pipeline import auto_categorize_folder, search_folder, events_folder
+from photo_categorizer.results import OUTPUT_MODES
+from photo_categorizer.sources import is_image_source
+
+
+def parse_output(value):
+    """Parse a FOLDER=PROMPT pair."""
+    folder_name, sep, prompt = value.partition("=")
+    if not sep or not folder_name.strip() or not prompt.strip():
+        raise argparse.ArgumentTypeError(f"Expected FOLDER=PROMPT, got '{value}'")
+    return folder_name.strip(), prompt.strip()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="photo-categorizer", description="Categorize photo folders without the GUI.")
+    parser.add_argument("--model", default=ModelTypes.CLIP.value, choices=[m.value for m in ModelTypes])
+    parser.add_argument("--workers", type=int, default=LOADER_WORKERS,
+                        help="threads decoding and preprocessing images")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads for encoding")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="images per encoder pass; autotuned per machine when omitted, "
+                             "otherwise only the thread count is tuned")
+    parser.add_argument("--output-mode", choices=OUTPUT_MODES, default="copy",
+                        help="copy files, hard link them, or only report what would change")
+    parser.add_argument("--cache-dir", default=None, help="embedding cache location")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the embedding cache")
+    parser.add_argument("--remote", action="append", default=[], metavar="URL",
+                        help="worker backend encoding shards of auto and events folders, may be repeated")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    auto_parser = subparsers.add_parser("auto", help="auto categorize folders into fixed and discovered categories")
+    auto_parser.add_argument("folders", nargs="+")
+    auto_parser.add_argument("--multi-label", action="store_true", default=MULTI_LABEL,
+                             help="put images in every fixed category they pass, hard linked instead of copied")
+
+    events_parser = subparsers.add_parser("events", help="group folders into events by capture time and place")
+    events_parser.add_argument("folders", nargs="+")
+
+    search_parser = subparsers.add_parser("search", help="split a category folder by prompts")
+    search_parser.add_argument("folders", nargs="+")
+    search_parser.add_argument("--category", required=True, help="category folder inside each target folder")
+    search_parser.add_argument("--output", type=parse_output, action="append", required=True,
+                               metavar="FOLDER=PROMPT", help="output folder and prompt, may be repeated")
+    search_parser.add_argument("--threshold", type=float, default=THRESHOLD)
+
+    index_parser = subparsers.add_parser("index", help="fill the embedding cache of library roots at low priority")
+    index_parser.add_argument("roots", nargs="*", help="folders or archives to crawl (default: LIBRARY_ROOTS)")
+    index_parser.add_argument("--watch", action="store_true", help="keep running and re-crawl on a schedule")
+    index_parser.add_argument("--force", action="store_true",
+                              help="index every folder now, ignoring the off-peak window and up-to-date indexes")
+    return parser
+
+
+def configure_engine(model, args):
+    if AUTOTUNE and not (args.batch_size and args.threads):
+        # A given batch size leaves only the thread count to tune
+        tuning = autotune(model, batch_size=args.batch_size)
+        print(f"Autotuned: batch size {tuning['batch_size']}, {tuning['threads']} threads")
+    if args.batch_size:
+        model.batch_size = args.batch_size
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    if args.no_cache:
+        model.embedding_cache = None
+    elif args.cache_dir:
+        model.embedding_cache = EmbeddingCache(model.model_id, args.cache_dir)
+
+
+def load_folder(model, folder, args, coordinator=None):
+    if coordinator is not None:
+        coordinator.load(model, folder)
+    else:
+        model.load_images_from_directory(folder, workers=args.workers)
+
+
+def run_auto(model, folder, args, coordinator=None):
+    load_folder(model, folder, args, coordinator)
+    load_stats = dict(model.load_stats)
+    _, results = auto_categorize_folder(model, folder, mode=args.output_mode, multi_label=args.multi_label)
+    counts = {category: len(names) for category, names in results.items()}
+    return load_stats, counts
+
+
+def run_events(model, folder, args, coordinator=None):
+    load_folder(model, folder, args, coordinator)
+    load_stats = dict(model.load_stats)
+    _, results = events_folder(model, folder, mode=args.output_mode, workers=args.workers)
+    counts = {event: len(names) for event, names in results.items()}
+    return load_stats, counts
+
+
+def run_search(model, folder, args):
+    counts = {}
+    load_stats = new_load_stats()
+    for folder_name, prompt in args.output:
+        _, _, result = search_folder(model, folder, args.category, folder_name, prompt,
+                                     threshold=args.threshold, mode=args.output_mode, workers=args.workers)
+        counts[folder_name] = len(result.select("threshold", args.threshold))
+        for key in load_stats:
+            load_stats[key] += model.load_stats[key]
+        model.clean_memory()
+    return load_stats, counts
+
+
+def run_index(model, args):
+    lower_priority(threads=args.threads or INDEXER_THREADS)
+    indexer = LibraryIndexer(model, args.roots or LIBRARY_ROOTS)
+    if not indexer.roots:
+        print("No library roots given and LIBRARY_ROOTS is empty", file=sys.stderr)
+        return 1
+    if args.watch:
+        indexer.run_forever()
+    indexer.run_once(force=args.force)
+    print(f"Indexed {indexer.stats['indexed']} of {indexer.stats['folders']} folders, "
+          f"{indexer.stats['decoded']} images encoded")
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    start = time.perf_counter()
+    model = ModelFactory.get_model(args.model)
+    configure_engine(model, args)
+    print(f"Model loaded in {time.perf_counter() - start:.1f}s")
+    if args.command == "index":
+        return run_index(model, args)
+
+    coordinator = None
+    if args.remote:
+        coordinator = Coordinator(model.model_id, [])
+        for url in args.remote:
+            coordinator.register(url, args.model)
+
+    total_images = 0
+    total_seconds = 0.0
+    failures = 0
+    for folder in args.folders:
+        if not is_image_source(folder):
+            print(f"Skipping {folder}: not a directory, archive or objstore:// URI", file=sys.stderr)
+            failures += 1
+            continue
+
+        folder_start = time.perf_counter()
+        try:
+            if args.command == "auto":
+                load_stats, counts = run_auto(model, folder, args, coordinator)
+            elif args.command == "events":
+                load_stats, counts = run_events(model, folder, args, coordinator)
+            else:
+                load_stats, counts = run_search(model, folder, args)
+        except Exception as e:
+            logger.error(f"Failed to process {folder}: {e}")
+            print(f"Failed {folder}: {e}", file=sys.stderr)
+            failures += 1
+            continue
+        finally:
+            model.clean_memory()
+
+        seconds = time.perf_counter() - folder_start
+        images = load_stats["cached"] + load_stats["decoded"]
+        total_images += images
+        total_seconds += seconds
+        summary = ", ".join(f"{name}: {count}" for name, count in counts.items())
+        print(f"{folder}: {images} images ({load_stats['cached']} cached, {load_stats['skipped']} skipped) "
+              f"in {seconds:.1f}s, {images / max(seconds, 1e-9):.1f} images/s | {summary}")
+
+    if total_seconds:
+        print(f"Total: {total_images} images in {total_seconds:.1f}s, "
+              f"{total_images / total_seconds:.1f} images/s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
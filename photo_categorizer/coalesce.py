@@ -0,0 +1,73 @@
+"""
+Coalescing of identical backend jobs.
+
+A job is identified by the folder it reads, the fingerprint of that folder's
+manifest, the prompts, the model and the thresholds (plus whatever else shapes its
+output). While a job runs, identical requests join it instead of starting another
+load and search; once it completes, its result answers identical requests for
+MEMO_TTL seconds. Results of a folder are dropped as soon as its manifest changes,
+or once one of the output folders the job wrote has been deleted.
+"""
+
+import json
+import threading
+import time
+
+from photo_categorizer.config import MEMO_TTL
+from photo_categorizer.sources import fingerprint, source_key, location_exists
+
+MEMO = "memo"
+JOINED = "joined"
+LEADER = "leader"
+
+
+def job_key(kind, folder, model_id, prompts, thresholds, *extra):
+    """Hashable key of a job; prompts and thresholds may be any JSON-serializable values."""
+    return (source_key(folder), fingerprint(folder), kind, model_id,
+            json.dumps(prompts, sort_keys=True), json.dumps(thresholds, sort_keys=True), *extra)
+
+
+class SingleFlight:
+    def __init__(self, ttl=MEMO_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inflight = set()
+        self._memo = {}  # key -> (expires, result, output folders)
+        self.stats = {"started": 0, "joined": 0, "memo_hits": 0}
+
+    def begin(self, key):
+        """
+        Returns (MEMO, result) if an identical job completed recently, (JOINED, None) if
+        one is running, or (LEADER, None) if the caller has to run it and call finish(key).
+        """
+        now = time.time()
+        with self._lock:
+            folder, manifest = key[0], key[1]
+            for memo_key, (expires, _, _) in list(self._memo.items()):
+                if expires < now or (memo_key[0] == folder and memo_key[1] != manifest):
+                    del self._memo[memo_key]
+            if key in self._memo and not all(location_exists(output) for output in self._memo[key][2]):
+                del self._memo[key]  # Outputs deleted since; run the job again
+            if key in self._memo:
+                self.stats["memo_hits"] += 1
+                return MEMO, self._memo[key][1]
+            if key in self._inflight:
+                self.stats["joined"] += 1
+                return JOINED, None
+            self._inflight.add(key)
+            self.stats["started"] += 1
+            return LEADER, None
+
+    def finish(self, key, result=None, outputs=()):
+        """
+        End a job started with begin(); a result of None (a failed job) is not memoized.
+        outputs are the folders the job wrote; the result is only reused while they exist.
+        """
+        with self._lock:
+            self._inflight.discard(key)
+            if result is not None and self.ttl:
+                self._memo[key] = (time.time() + self.ttl, result, list(outputs))
+
+    def status(self):
+        with self._lock:
+            return {**self.stats, "inflight": len(self._inflight), "memoized": len(self._memo), "ttl": self.ttl}
@@ -1,3 +1,5 @@
+import os
+
 # Backend Configuration
 BACKEND_HOST = "127.0.0.1"
 BACKEND_PORT = 5050
@@ -13,4 +15,101 @@ THRESHOLD = 22
 
 FIXED_CATEGORIES = ["pets", "people", "food", "landscape"]
 MAX_TOTAL_CATEGORIES = 5
+CATEGORY_THRESHOLDS = {}  # Per-category score thresholds, e.g. {"people": 24}; others use THRESHOLD
+MULTI_LABEL = False  # Put an image in every fixed category it passes instead of only the first
+
+# Image files picked up from a target folder
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png"]
+
+# Cache Configuration
+CACHE_DIR = os.path.expanduser("~/.photo_categorizer_cache")
+
+# Image Sources
+OBJECT_STORE_ROOT = os.path.join(CACHE_DIR, "object_store")  # Local stand-in serving objstore://bucket/prefix
+
+# Thumbnails
+THUMBNAIL_SIZE = 256  # Longest edge in pixels
+THUMBNAIL_MIN_SIZE = THUMBNAIL_SIZE // 4  # Sizes /thumbnail requests are clamped to; each size is cached apart
+THUMBNAIL_MAX_SIZE = THUMBNAIL_SIZE * 2
+THUMBNAIL_WORKERS = 4  # Background threads generating thumbnails
+THUMBNAIL_MEMORY_ITEMS = 500  # Decoded thumbnails kept in memory by the results view
+
+# Result Channel
+# Score results shared with the GUI through memory-mapped files; tmpfs keeps them off the disk
+# Per user: /dev/shm is shared by everyone on the machine
+RESULT_CHANNEL_DIR = f"/dev/shm/photo_categorizer-{os.getuid()}" \
+    if os.path.isdir("/dev/shm") and hasattr(os, "getuid") else os.path.join(CACHE_DIR, "channel")
+RESULT_CHANNEL_MAX_MB = 512  # Published results beyond this total are removed, oldest first (tmpfs is RAM)
+RESULT_CHANNEL_MAX_AGE = 3600  # Seconds a published result is kept
+
+# Model Lifecycle
+MODEL_IDLE_TIMEOUT = 600  # Seconds without use before the model is unloaded, 0 keeps it loaded
+MODEL_WARMUP = True  # Run a warm-up forward pass whenever the model is loaded
+
+# Cluster Naming
+LABEL_BANK_FILE = os.path.join(os.path.dirname(__file__), "model", "labels.txt")  # One candidate label per line
+LABEL_PROMPT_TEMPLATE = "a photo of {}"
+CLUSTER_LABEL_MIN_SCORE = THRESHOLD  # Clusters whose best label scores lower are named "other"
+
+# Category Tree
+# Sub-categories applied inside auto categorized folders, reusing the parent embeddings, e.g.
+# {"pets": {"dogs": "a photo of a dog", "cats": {"kittens": "a photo of a kitten"}}}.
+# A string is the prompt of a leaf; a dict is a subtree prompted with LABEL_PROMPT_TEMPLATE.
+CATEGORY_TREE = {}
+
+# Events
+EVENTS_FOLDER = "events"  # Events mode writes <target_folder>/events/<date>/
+EVENT_GAP_HOURS = 6  # A longer pause between consecutive photos starts a new segment
+EVENT_DISTANCE_KM = 50  # So does a jump of this distance between consecutive geotagged photos
+EVENT_MERGE_SIMILARITY = 0.8  # Neighbouring segments whose mean embeddings are this similar (cosine) are merged
+EVENT_MERGE_GAP_HOURS = 48  # ... if they are at most this far apart
+
+# Image Loading
+LOADER_WORKERS = 4  # Threads decoding and preprocessing images
+EMBEDDING_CACHE = True  # Keep image embeddings on disk so unchanged images are never decoded twice
+
+# Fault Tolerance
+MAX_IMAGE_PIXELS = 100_000_000  # Larger images are skipped from their header, before decoding
+DECODE_TIMEOUT = 30  # Seconds one image may take to decode before it is skipped
+QUARANTINE_DIR = os.path.join(CACHE_DIR, "quarantine")  # Reports of images that could not be loaded, per source
+QUARANTINE_RETRY_SECONDS = 3600  # Timeouts and I/O errors may pass; such files are retried after this, times the tries
+QUARANTINE_RETRIES = 3  # ... and quarantined for good after failing this many loads in a row
+
+# Batch Size Autotuning
+AUTOTUNE = True  # Time batch sizes and thread counts on first model load, cached per machine
+AUTOTUNE_BATCH_SIZES = [8, 16, 32, 64, 128]
+AUTOTUNE_MEMORY_FRACTION = 0.25  # Share of available memory a batch may use
+
+# Jobs
+CHECKPOINT_INTERVAL = 1000  # Images decoded and encoded between embedding checkpoints
+JOB_MAX_ATTEMPTS = 3  # Resumes of a failed job before it is given up
+JOB_RETENTION = 7 * 24 * 3600  # Seconds journals of completed or given-up jobs are kept
+
+# Scheduling
+SLO_SECONDS = {"interactive": 5.0, "bulk": 3600.0}  # Latency targets per job priority class, reported by /scheduler
+SLO_WINDOW = 500  # Recent jobs per class kept for latency percentiles
+MATERIALIZE_YIELD_FILES = 100  # Files a bulk job places between yield points, where waiting interactive jobs go first
+
+# Request Coalescing
+MEMO_TTL = 300  # Seconds a completed job answers identical requests, while its folder is unchanged
+
+# Coordinator
+COORDINATOR_WORKERS = []  # Worker backend URLs, e.g. ["http://10.0.0.2:5050"]; empty to encode locally
+COORDINATOR_SHARD_SIZE = 500  # Images per shard sent to a worker
+COORDINATOR_RETRIES = 3  # Attempts per shard, each on a worker that has not failed it yet where possible
+COORDINATOR_TIMEOUT = 600  # Seconds a worker may take to encode one shard
+
+# Background Indexing
+LIBRARY_ROOTS = []  # Folders and archives crawled by the indexer, e.g. [os.path.expanduser("~/Pictures")]
+INDEXER_WINDOW = (1, 6)  # Local hours [start, end) when indexing always runs; None to rely on idleness only
+INDEXER_IDLE_CPU = 20  # Outside the window, index only while system CPU use is below this percent
+INDEXER_INTERVAL = 3600  # Seconds between crawls of the library roots
+INDEXER_THREADS = 2  # torch threads the indexer may use
+INDEXER_WORKERS = 2  # Threads decoding images for the indexer
+INDEXER_NICE = 19  # CPU niceness of the indexer process (I/O runs in the idle class where supported)
+OUTPUT_MARKER = ".photo_categorizer_output"  # Written into every output folder; the indexer skips marked folders
+INDEX_DIR = os.path.join(CACHE_DIR, "indexes")  # Library indexes written by the indexer
 
+# Memory Profiling
+MEMORY_PROFILE_JOBS = 50  # Job memory reports kept for /memory-profile
+MEMORY_TRACEMALLOC = False  # Trace Python allocations per job (slows jobs down noticeably)
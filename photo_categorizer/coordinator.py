@@ -0,0 +1,280 @@
+"""
+Multi-node encoding.
+
+A coordinator splits the images of a source into shards of COORDINATOR_SHARD_SIZE
+and dispatches them to registered worker backends (the regular Flask backend,
+POST /encode-shard), one shard in flight per worker so faster workers simply take
+more shards. Workers must see the source under the same location (a shared mount
+or object store). The returned embeddings are added to the local engine and
+written to its embedding cache; clustering and category assignment then run
+centrally, exactly as for a locally loaded folder.
+
+A shard that fails is retried on a worker that has not failed it yet, as is one
+naming images the worker cannot find; a worker that cannot be reached is dropped
+until it is registered again. Images a worker cannot decode come back with the
+reason and are quarantined in the coordinator's report as well as the worker's.
+
+Several workers can be tried out on one machine:
+
+    python -m photo_categorizer.coordinator --spawn 3 --model stub --images 2000
+"""
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import requests
+
+from photo_categorizer.config import COORDINATOR_WORKERS, COORDINATOR_SHARD_SIZE, COORDINATOR_RETRIES, \
+    COORDINATOR_TIMEOUT, BACKEND_HOST
+from photo_categorizer.logger import logger
+from photo_categorizer.model.BaseModelEngine import BaseModelEngine
+from photo_categorizer.sources import open_source
+from photo_categorizer.state import StateTypes
+
+SHARD_ERRORS = (requests.RequestException, ValueError, RuntimeError)
+
+
+class Coordinator:
+    def __init__(self, model_id, workers=None, shard_size=COORDINATOR_SHARD_SIZE, retries=COORDINATOR_RETRIES,
+                 timeout=COORDINATOR_TIMEOUT):
+        self.model_id = model_id
+        self.shard_size = shard_size
+        self.retries = retries
+        self.timeout = timeout
+        self.workers = {}
+        self.lock = threading.Lock()
+        for url in workers if workers is not None else COORDINATOR_WORKERS:
+            self.add_worker(url)
+
+    def add_worker(self, url):
+        url = url.rstrip("/")
+        with self.lock:
+            self.workers[url] = {"alive": True, "shards": 0, "images": 0, "failures": 0, "seconds": 0.0}
+        return url
+
+    def remove_worker(self, url):
+        with self.lock:
+            return self.workers.pop(url.rstrip("/"), None) is not None
+
+    def register(self, url, model_type, wait=300):
+        """Ask a worker backend to load model_type, wait until it is loaded and add it to the pool."""
+        url = url.rstrip("/")
+        requests.post(f"{url}/load-model", json={"model": model_type}, timeout=10).raise_for_status()
+        deadline = time.time() + wait
+        while requests.get(f"{url}/model-status", timeout=10).json().get("status") != \
+                StateTypes.MODEL_LOADED.value:
+            if time.time() > deadline:
+                raise RuntimeError(f"Worker {url} did not load {model_type} within {wait}s")
+            time.sleep(0.5)
+        logger.info(f"Registered worker {url}")
+        return self.add_worker(url)
+
+    def live_workers(self):
+        with self.lock:
+            return [url for url, stats in self.workers.items() if stats["alive"]]
+
+    def status(self):
+        with self.lock:
+            return {"shard_size": self.shard_size, "workers": {url: dict(stats) for url, stats in self.workers.items()}}
+
+    def load(self, model: BaseModelEngine, image_dir):
+        """Load a source into model like load_images_from_directory, encoding the uncached images on the workers."""
+        logger.info(f"Loading images from {image_dir} on {len(self.live_workers())} workers")
+        files = model.skip_quarantined(image_dir, open_source(image_dir).list_files())
+        files = model.take_cached_embeddings(image_dir, files)
+        if files:
+            names, embeddings, failures = self.encode(image_dir, [f[0] for f in files], model.batch_boundary)
+            if names:
+                model.add_embeddings(names, embeddings)
+                model.cache_embeddings(names, embeddings)
+            model.quarantine_failures(image_dir, files, failures)
+        logger.info(f"Loaded {len(model.image_names)} images, {model.load_stats['cached']} from embedding cache, "
+                    f"{model.load_stats['skipped']} skipped.")
+
+    def encode(self, image_dir, names, boundary=None):
+        """
+        Encode `names` of a source on the workers. Returns (names, embeddings, failures) with
+        names and embeddings in shard order, and [(name, reason, transient)] of the images
+        workers could not decode.
+        boundary is called on this thread whenever a shard completes, like an engine's
+        batch_boundary between encoder batches.
+        """
+        shards = [names[i:i + self.shard_size] for i in range(0, len(names), self.shard_size)]
+        tried = [set() for _ in shards]
+        attempts = [0] * len(shards)
+        results = {}
+        pending = list(range(len(shards)))
+        while pending:
+            live = self.live_workers()
+            if not live:
+                raise RuntimeError(f"No live workers left, {len(pending)} of {len(shards)} shards not encoded")
+            for index in pending:
+                if tried[index] >= set(live):
+                    tried[index].clear()  # Every live worker failed it once; let them try again
+            pending = self._dispatch(image_dir, shards, pending, tried, attempts, results, live, boundary)
+            exhausted = [index for index in pending if attempts[index] >= self.retries]
+            if exhausted:
+                raise RuntimeError(f"{len(exhausted)} shards of {image_dir} failed {self.retries} times")
+
+        order = [name for index in range(len(shards)) for name in results[index][0]]
+        parts = [results[index][1] for index in range(len(shards)) if len(results[index][0])]
+        failures = [failure for index in range(len(shards)) for failure in results[index][2]]
+        return order, np.concatenate(parts) if parts else None, failures
+
+    def _dispatch(self, image_dir, shards, pending, tried, attempts, results, live, boundary=None):
+        """Run pending shards on the live workers; returns the shards still pending afterwards."""
+        queue = deque(pending)
+        lock = threading.Lock()
+        progress = threading.Event()
+
+        def run(url):
+            while True:
+                with lock:
+                    index = next((i for i in queue if url not in tried[i] and attempts[i] < self.retries), None)
+                    if index is None:
+                        return
+                    queue.remove(index)
+                    attempts[index] += 1
+                try:
+                    results[index] = self._encode_shard(url, image_dir, shards[index])
+                    progress.set()
+                except SHARD_ERRORS as e:
+                    logger.warning(f"Shard {index} of {image_dir} failed on {url}: {e}")
+                    unreachable = isinstance(e, (requests.ConnectionError, requests.Timeout))
+                    with self.lock:
+                        self.workers[url]["failures"] += 1
+                        if unreachable:
+                            self.workers[url]["alive"] = False
+                    with lock:
+                        tried[index].add(url)
+                        queue.append(index)  # Picked up by another worker of this round if one is eligible
+                    if unreachable:
+                        return
+
+        threads = [threading.Thread(target=run, args=(url,), daemon=True) for url in live]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            # The workers encode remotely; a paused job only holds back collecting their results
+            if progress.wait(timeout=1.0):
+                progress.clear()
+                if boundary is not None:
+                    boundary()
+        for thread in threads:
+            thread.join()
+        return sorted(queue)
+
+    def _encode_shard(self, url, image_dir, names):
+        start = time.perf_counter()
+        response = requests.post(f"{url}/encode-shard", json={"target_folder": image_dir, "names": names},
+                                 timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(response.json().get("error", f"HTTP {response.status_code}"))
+        with np.load(io.BytesIO(response.content)) as data:
+            model_id = str(data["model_id"])
+            shard_names = data["names"].tolist()
+            embeddings = data["embeddings"]
+            skipped = data["skipped"].tolist()
+            reasons = data["reasons"].tolist() if "reasons" in data else ["not loaded on worker"] * len(skipped)
+            transient = data["transient"].tolist() if "transient" in data else [True] * len(skipped)
+        if model_id != self.model_id:
+            raise ValueError(f"Worker encodes with {model_id}, not {self.model_id}")
+        if sorted(shard_names + skipped) != sorted(names):
+            raise RuntimeError(f"Worker returned {len(shard_names)} of {len(names)} images")
+        with self.lock:
+            stats = self.workers[url]
+            stats["shards"] += 1
+            stats["images"] += len(names)
+            stats["seconds"] += time.perf_counter() - start
+        return shard_names, embeddings, list(zip(skipped, reasons, transient))
+
+
+def spawn_workers(count, base_port):
+    """Start `count` backends on consecutive localhost ports and wait until they answer."""
+    backend = os.path.join(os.path.dirname(__file__), "backend", "backend.py")
+    processes = [subprocess.Popen([sys.executable, backend, "--host", BACKEND_HOST, "--port", str(base_port + i)])
+                 for i in range(count)]
+    urls = [f"http://{BACKEND_HOST}:{base_port + i}" for i in range(count)]
+    for url in urls:
+        deadline = time.time() + 60
+        while True:
+            try:
+                requests.get(f"{url}/model-status", timeout=2)
+                break
+            except requests.ConnectionError:
+                if time.time() > deadline:
+                    raise RuntimeError(f"Worker {url} did not start")
+                time.sleep(0.5)
+    return processes, urls
+
+
+def main(argv=None):
+    from photo_categorizer.model.model_factory import ModelFactory
+    from photo_categorizer.model.model_types import ModelTypes
+    from photo_categorizer.pipeline import auto_categorize_folder
+    from photo_categorizer.results import OUTPUT_MODES
+    from photo_categorizer.soak import make_library
+
+    parser = argparse.ArgumentParser(prog="photo_categorizer.coordinator", description=__doc__.splitlines()[1])
+    parser.add_argument("folder", nargs="?", help="source to categorize (default: a generated library)")
+    parser.add_argument("--worker", action="append", default=[], help="worker backend URL, may be repeated")
+    parser.add_argument("--spawn", type=int, default=0, help="start this many worker backends on localhost")
+    parser.add_argument("--base-port", type=int, default=5061)
+    parser.add_argument("--model", default=ModelTypes.STUB.value, choices=[m.value for m in ModelTypes])
+    parser.add_argument("--images", type=int, default=2000, help="size of the generated library")
+    parser.add_argument("--shard-size", type=int, default=COORDINATOR_SHARD_SIZE)
+    parser.add_argument("--output-mode", choices=OUTPUT_MODES, default="dry-run")
+    args = parser.parse_args(argv)
+
+    processes = []
+    library = None
+    try:
+        urls = list(args.worker)
+        if args.spawn:
+            processes, spawned = spawn_workers(args.spawn, args.base_port)
+            urls += spawned
+        if not urls:
+            parser.error("give --worker URLs or --spawn N")
+
+        model = ModelFactory.get_model(args.model)
+        model.embedding_cache = None  # Measure the workers, not the local cache
+        coordinator = Coordinator(model.model_id, [], shard_size=args.shard_size)
+        for url in urls:
+            coordinator.register(url, args.model)
+
+        folder = args.folder
+        if folder is None:
+            library = tempfile.mkdtemp(prefix="photo_coordinator_")
+            folder = os.path.join(library, "library")
+            make_library(folder, args.images)
+
+        start = time.perf_counter()
+        coordinator.load(model, folder)
+        encoded = time.perf_counter() - start
+        _, results = auto_categorize_folder(model, folder, mode=args.output_mode)
+        total = time.perf_counter() - start
+
+        print(f"{len(model.image_names)} images encoded on {len(urls)} workers in {encoded:.1f}s, "
+              f"categorized in {total:.1f}s")
+        for url, stats in coordinator.status()["workers"].items():
+            print(f"  {url}: {stats['shards']} shards, {stats['images']} images, {stats['failures']} failures"
+                  f"{'' if stats['alive'] else ' (dropped)'}")
+        print(", ".join(f"{category}: {len(names)}" for category, names in results.items()))
+    finally:
+        for process in processes:
+            process.terminate()
+        if library:
+            shutil.rmtree(library, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Event grouping.
+
+Photos of one event are taken close together in time. Events mode reads the capture
+time (and GPS position, if present) of every image from its EXIF header, without
+decoding any pixels, and splits the time-sorted library wherever consecutive photos
+are more than EVENT_GAP_HOURS or EVENT_DISTANCE_KM apart. Neighbouring segments are
+then merged when their mean embeddings are similar and the gap between them is
+short, so embeddings are only ever compared between adjacent segments: one
+vectorized pass over the library instead of clustering all pairs of images.
+
+Images without an EXIF capture time fall back to their file modification time.
+Archive members are only read up to the end of their header, and at most a few
+reads per worker are in flight, so events mode never holds a whole archive in memory.
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+from PIL import Image
+
+from photo_categorizer.config import EVENT_GAP_HOURS, EVENT_DISTANCE_KM, EVENT_MERGE_SIMILARITY, \
+    EVENT_MERGE_GAP_HOURS, LOADER_WORKERS
+from photo_categorizer.logger import logger
+from photo_categorizer.sources import open_source
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+DATETIME = 0x0132
+DATETIME_ORIGINAL = 0x9003
+EARTH_RADIUS_KM = 6371.0
+
+
+def _gps_degrees(value, ref):
+    degrees, minutes, seconds = (float(part) for part in value)
+    degrees += minutes / 60 + seconds / 3600
+    return -degrees if ref in ("S", "W") else degrees
+
+
+def read_capture_info(payload):
+    """(timestamp or None, (lat, lon) or None) from the EXIF header of a file path or raw (header) bytes."""
+    with Image.open(io.BytesIO(payload) if isinstance(payload, bytes) else payload) as image:
+        exif = image.getexif()  # Parsed from the header; the image data is never decoded
+        taken = exif.get_ifd(EXIF_IFD).get(DATETIME_ORIGINAL) or exif.get(DATETIME)
+        gps = exif.get_ifd(GPS_IFD)
+
+    timestamp = None
+    if taken:
+        try:
+            timestamp = datetime.strptime(str(taken).strip("\x00 "), "%Y:%m:%d %H:%M:%S").timestamp()
+        except ValueError:
+            pass
+    position = None
+    if 2 in gps and 4 in gps:
+        try:
+            position = (_gps_degrees(gps[2], gps.get(1, "N")), _gps_degrees(gps[4], gps.get(3, "E")))
+        except (TypeError, ValueError, ZeroDivisionError):
+            pass
+    return timestamp, position
+
+
+def read_capture_infos(image_dir, names, workers=LOADER_WORKERS):
+    """
+    Capture time and position of `names`, as float arrays (times in seconds, positions
+    (n, 2) with NaN where unknown). Returns (times, positions, exif_count).
+    """
+    source = open_source(image_dir)
+    mtimes = {name: mtime / 1e9 for name, _, mtime in source.list_files()}
+
+    def read(item):
+        name, payload = item
+        try:
+            return name, read_capture_info(payload)
+        except Exception as e:
+            logger.warning(f"Could not read EXIF of {name}: {e}")
+            return name, (None, None)
+
+    headers = source.iter_headers(names)
+    infos = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Executor.map submits everything at once; bound the payloads held by taking them in chunks
+        while True:
+            chunk = list(islice(headers, max(1, workers) * 4))
+            if not chunk:
+                break
+            infos.update(executor.map(read, chunk))
+
+    times = np.array([infos[name][0] if infos[name][0] is not None else mtimes[name] for name in names])
+    positions = np.array([infos[name][1] or (np.nan, np.nan) for name in names], dtype=np.float64).reshape(-1, 2)
+    exif_count = sum(infos[name][0] is not None for name in names)
+    return times, positions, exif_count
+
+
+def haversine_km(a, b):
+    """Great-circle distance between rows of two (n, 2) arrays of degrees; NaN where a position is unknown."""
+    lat1, lon1, lat2, lon2 = (np.radians(column) for column in (a[:, 0], a[:, 1], b[:, 0], b[:, 1]))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def segment_by_time(times, positions, gap_hours=EVENT_GAP_HOURS, distance_km=EVENT_DISTANCE_KM):
+    """
+    Sort images by time and split them where consecutive photos are far apart in time
+    or space. Returns (order, starts): the sorting permutation and the first position
+    of every segment in it.
+    """
+    order = np.argsort(times, kind="stable")
+    sorted_times = times[order]
+    breaks = np.diff(sorted_times) > gap_hours * 3600
+    if distance_km:
+        sorted_positions = positions[order]
+        with np.errstate(invalid="ignore"):
+            breaks |= haversine_km(sorted_positions[:-1], sorted_positions[1:]) > distance_km
+    starts = np.concatenate([[0], np.flatnonzero(breaks) + 1]) if len(times) else np.zeros(0, dtype=np.int64)
+    return order, starts
+
+
+def merge_segments(embeddings, times, starts, similarity=EVENT_MERGE_SIMILARITY,
+                   merge_gap_hours=EVENT_MERGE_GAP_HOURS):
+    """
+    Merge each segment into its predecessor when their mean embeddings are similar and
+    the gap between them is short. embeddings and times are in time order.
+    Returns the starts of the merged segments.
+    """
+    if len(starts) < 2:
+        return starts
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    centroids = np.add.reduceat(unit, starts, axis=0)
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    neighbour_similarity = np.sum(centroids[:-1] * centroids[1:], axis=1)
+    gaps = times[starts[1:]] - times[starts[1:] - 1]
+    merged = (neighbour_similarity > similarity) & (gaps <= merge_gap_hours * 3600)
+    return starts[np.concatenate([[True], ~merged])]
+
+
+def event_names(times, starts):
+    """Folder name of each event: its start date, with the start time where a day has several events."""
+    days = [datetime.fromtimestamp(times[start]).strftime("%Y-%m-%d") for start in starts]
+    names = []
+    for day, start in zip(days, starts):
+        names.append(day if day not in names else f"{day}_{datetime.fromtimestamp(times[start]):%H%M%S}")
+    return names
+
+
+def group_events(image_names, embeddings, times, positions):
+    """Group images into events. Returns {event name: [image names in time order]}."""
+    order, starts = segment_by_time(times, positions)
+    if not len(order):
+        return {}
+    sorted_times = times[order]
+    starts = merge_segments(embeddings[order], sorted_times, starts)
+    ends = np.append(starts[1:], len(order))
+    return {name: [image_names[i] for i in order[start:end]]
+            for name, start, end in zip(event_names(sorted_times, starts), starts, ends)}
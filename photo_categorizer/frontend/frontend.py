@@ -14,6 +14,7 @@ from PyQt6.QtCore import Qt, QTimer
 from photo_categorizer.logger import logger
 from photo_categorizer.model.model_types import ModelTypes
 from photo_categorizer.state import StateTypes
+from photo_categorizer.frontend.results_view import ResultsView
 from PyQt6.QtWidgets import QProgressBar
 from photo_categorizer.config import BASE_URL, BACKEND_PORT, BACKEND_HOST, FIXED_CATEGORIES
 import psutil
@@ -244,18 +245,14 @@ class PhotoCategorizerApp(QWidget):
         step2_label.setProperty("class", "step-label")
         layout.addWidget(step2_label)
 
-        category_layout = QHBoxLayout()
+        self.category_layout = QHBoxLayout()
         category_label = QLabel("Categories:")
-        category_layout.addWidget(category_label)
+        self.category_layout.addWidget(category_label)
 
         self.category_group = QButtonGroup(self)
-        categories = FIXED_CATEGORIES + ["other"]
-        for cat in categories:
-            btn = QRadioButton(cat)
-            self.category_group.addButton(btn)
-            category_layout.addWidget(btn)
+        self.set_categories(FIXED_CATEGORIES + ["other"])
 
-        layout.addLayout(category_layout)
+        layout.addLayout(self.category_layout)
 
         layout.addSpacing(20)
 
@@ -312,11 +309,21 @@ class PhotoCategorizerApp(QWidget):
         self.state_label = QLabel()
         layout.addWidget(self.state_label, alignment=Qt.AlignmentFlag.AlignLeft)
 
-        # Add this to force 'other' selected at the end
+    def set_categories(self, categories):
+        """Rebuild the category radio buttons, selecting the last (discovered) category."""
         for btn in self.category_group.buttons():
-            if btn.text().lower() == "other":
-                btn.setChecked(True)  # Ensure it's selected
+            self.category_group.removeButton(btn)
+            self.category_layout.removeWidget(btn)
+            btn.deleteLater()
+
+        for cat in categories:
+            btn = QRadioButton(cat)
+            self.category_group.addButton(btn)
+            self.category_layout.addWidget(btn)
 
+        buttons = self.category_group.buttons()
+        if buttons:
+            buttons[-1].setChecked(True)  # Ensure it's selected
 
     def resource_path(self, relative_path):
         """Get absolute path to resource, works for dev and PyInstaller."""
@@ -389,8 +396,11 @@ class PhotoCategorizerApp(QWidget):
 
                     if status == "completed":
                         logger.info("First categorization completed.")
+                        categories = response.json().get('categories')
+                        if categories:
+                            self.set_categories(categories)
                         self.switchState(StateTypes.FIRST_CATEGORIZED)
-                        self.ask_to_open_folder(self.target_entry.text().strip())
+                        self.show_results(self.target_entry.text().strip())
 
                     elif status == "error":
                         logger.error(
@@ -569,8 +579,8 @@ class PhotoCategorizerApp(QWidget):
 
         self.switchState(StateTypes.SECOND_CATEGORIZED)
 
-        self.ask_to_open_folder(os.path.join(self.target_entry.text().strip(),
-                                             self.category_group.checkedButton().text()))
+        self.show_results(os.path.join(self.target_entry.text().strip(),
+                                       self.category_group.checkedButton().text()))
         # Step 5: Reset interface
         self.layout().removeWidget(self.progress_bar)
         self.progress_bar.deleteLater()
@@ -582,6 +592,13 @@ class PhotoCategorizerApp(QWidget):
         self.add_output_input()
         self.switchState(StateTypes.FIRST_CATEGORIZED)
 
+    def show_results(self, folder_path: str):
+        """Show the categorized folder in the in-app thumbnail grid."""
+        if hasattr(self, 'results_view') and self.results_view is not None:
+            self.results_view.close()
+        self.results_view = ResultsView(folder_path, open_folder=self.open_folder, parent=self)
+        self.results_view.show()
+
     def ask_to_open_folder(self, folder_path: str):
         """Ask user if they want to open the target folder and open it if Yes."""
         choice = QMessageBox.question(
@@ -589,17 +606,21 @@ class PhotoCategorizerApp(QWidget):
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         if choice == QMessageBox.StandardButton.Yes:
-            system_platform = platform.system()
-            try:
-                if system_platform == "Windows":
-                    os.startfile(os.path.abspath(os.path.normpath(folder_path)))
-                elif system_platform == "Darwin":  # macOS
-                    os.system(f'open "{folder_path}"')
-                else:  # Linux and others
-                    os.system(f'xdg-open "{folder_path}"')
-            except Exception as e:
-                logger.error(f"Failed to open folder {folder_path}: {e}")
-                QMessageBox.critical(self, "Error", f"Failed to open folder: {e}")
+            self.open_folder(folder_path)
+
+    def open_folder(self, folder_path: str):
+        """Open a folder in the system file browser."""
+        system_platform = platform.system()
+        try:
+            if system_platform == "Windows":
+                os.startfile(os.path.abspath(os.path.normpath(folder_path)))
+            elif system_platform == "Darwin":  # macOS
+                os.system(f'open "{folder_path}"')
+            else:  # Linux and others
+                os.system(f'xdg-open "{folder_path}"')
+        except Exception as e:
+            logger.error(f"Failed to open folder {folder_path}: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to open folder: {e}")
 
     def switchState(self, state: StateTypes):
         self.state = state
@@ -0,0 +1,208 @@
+import os
+from collections import OrderedDict
+
+import requests
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QListView, QPushButton, QDoubleSpinBox
+)
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QObject, QSize, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap, QIcon
+from photo_categorizer.logger import logger
+from photo_categorizer.config import IMAGE_EXTENSIONS, THUMBNAIL_SIZE, THUMBNAIL_MEMORY_ITEMS, BASE_URL, THRESHOLD
+from photo_categorizer.result_channel import open_handle
+from photo_categorizer.thumbnails import get_thumbnail_cache
+
+
+class ThumbnailSignals(QObject):
+    """Carries decoded thumbnails from worker threads back to the GUI thread."""
+    ready = pyqtSignal(str, QImage)
+
+
+class ThumbnailListModel(QAbstractListModel):
+    """
+    List model over image paths that loads thumbnails lazily.
+    The view only asks for decorations of visible rows, so only those are generated.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.image_paths = []
+        self.rows = {}  # image path -> row
+        self.pixmaps = OrderedDict()  # LRU of decoded thumbnails, image path -> QPixmap
+        self.requested = set()
+        self.placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self.placeholder.fill(Qt.GlobalColor.lightGray)
+        self.thumbnail_cache = get_thumbnail_cache()
+        self.signals = ThumbnailSignals()
+        # Queued connection: the slot runs on the GUI thread even though workers emit
+        self.signals.ready.connect(self.on_thumbnail_ready, Qt.ConnectionType.QueuedConnection)
+
+    def set_images(self, image_paths):
+        self.beginResetModel()
+        self.image_paths = image_paths
+        self.rows = {path: row for row, path in enumerate(image_paths)}
+        self.requested.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.image_paths)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        image_path = self.image_paths[index.row()]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(image_path)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return image_path
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self.pixmaps.get(image_path)
+            if pixmap is not None:
+                self.pixmaps.move_to_end(image_path)
+                return QIcon(pixmap)
+            self.request_thumbnail(image_path)
+            return QIcon(self.placeholder)
+        return None
+
+    def request_thumbnail(self, image_path):
+        if image_path in self.requested:
+            return
+        self.requested.add(image_path)
+        try:
+            self.thumbnail_cache.submit(image_path, self.decode_thumbnail)
+        except OSError as e:
+            logger.error(f"Failed to request thumbnail for {image_path}: {e}")
+
+    def decode_thumbnail(self, image_path, thumbnail_path):
+        """Runs on a worker thread: QImage (unlike QPixmap) may be created off the GUI thread."""
+        if thumbnail_path is None:
+            return
+        image = QImage(thumbnail_path)
+        if not image.isNull():
+            self.signals.ready.emit(image_path, image)
+
+    def on_thumbnail_ready(self, image_path, image):
+        row = self.rows.get(image_path)
+        if row is None:
+            return
+        self.pixmaps[image_path] = QPixmap.fromImage(image)
+        while len(self.pixmaps) > THUMBNAIL_MEMORY_ITEMS:
+            evicted, _ = self.pixmaps.popitem(last=False)
+            self.requested.discard(evicted)  # Reload from the disk cache if scrolled back into view
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class ResultsView(QDialog):
+    """
+    In-app results browser showing category contents as a thumbnail grid.
+    For prompt search outputs the full score result is read from the shared-memory
+    channel, so moving the preview cutoff re-filters locally without any request.
+    """
+
+    def __init__(self, folder_path, open_folder=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Results")
+        self.resize(900, 650)
+        self.folder_path = folder_path
+        self.open_folder = open_folder
+        self.shared_result = None
+
+        layout = QVBoxLayout(self)
+
+        header_layout = QHBoxLayout()
+        header_layout.addWidget(QLabel("Category:"))
+        self.category_combo = QComboBox()
+        self.category_combo.currentTextChanged.connect(self.show_category)
+        header_layout.addWidget(self.category_combo)
+        header_layout.addStretch()
+        self.cutoff_label = QLabel("Preview cutoff:")
+        self.cutoff_spin = QDoubleSpinBox()
+        self.cutoff_spin.setRange(0, 100)
+        self.cutoff_spin.setSingleStep(0.5)
+        self.cutoff_spin.setValue(THRESHOLD)
+        self.cutoff_spin.valueChanged.connect(self.preview_cutoff)
+        header_layout.addWidget(self.cutoff_label)
+        header_layout.addWidget(self.cutoff_spin)
+        self.count_label = QLabel()
+        header_layout.addWidget(self.count_label)
+        open_button = QPushButton("Open Folder")
+        open_button.clicked.connect(self.open_current_folder)
+        header_layout.addWidget(open_button)
+        layout.addLayout(header_layout)
+
+        self.model = ThumbnailListModel(self)
+        self.list_view = QListView()
+        self.list_view.setViewMode(QListView.ViewMode.IconMode)
+        self.list_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.list_view.setMovement(QListView.Movement.Static)
+        self.list_view.setIconSize(QSize(THUMBNAIL_SIZE // 2, THUMBNAIL_SIZE // 2))
+        self.list_view.setGridSize(QSize(THUMBNAIL_SIZE // 2 + 24, THUMBNAIL_SIZE // 2 + 40))
+        # Uniform sizes and batched layout keep huge result sets cheap to lay out
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.list_view.setBatchSize(200)
+        self.list_view.setModel(self.model)
+        layout.addWidget(self.list_view)
+
+        self.category_combo.addItems(self.list_categories())
+
+    def list_categories(self):
+        """Sub folders of the result folder, or the folder itself if it has none."""
+        try:
+            categories = sorted(entry.name for entry in os.scandir(self.folder_path) if entry.is_dir())
+        except OSError as e:
+            logger.error(f"Failed to list categories in {self.folder_path}: {e}")
+            return []
+        return categories or ["."]
+
+    def category_path(self, category):
+        return os.path.normpath(os.path.join(self.folder_path, category))
+
+    def show_category(self, category):
+        if not category:
+            return
+        folder = self.category_path(category)
+        self.open_shared_result(folder)
+        if self.shared_result is not None:
+            self.preview_cutoff(self.cutoff_spin.value())
+            return
+        try:
+            image_paths = sorted(
+                entry.path for entry in os.scandir(folder)
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+            )
+        except OSError as e:
+            logger.error(f"Failed to list images in {folder}: {e}")
+            image_paths = []
+        self.model.set_images(image_paths)
+        self.count_label.setText(f"{len(image_paths)} images")
+
+    def open_shared_result(self, folder):
+        """Ask the backend (control message only) for the shared score result of a folder."""
+        if self.shared_result is not None:
+            self.shared_result.close()
+            self.shared_result = None
+        try:
+            response = requests.get(f"{BASE_URL}result-channel", params={"path": folder}, timeout=2)
+            if response.status_code == 200:
+                self.shared_result = open_handle(response.json())
+        except requests.RequestException as e:
+            logger.info(f"No shared result for {folder}: {e}")
+        visible = self.shared_result is not None
+        self.cutoff_label.setVisible(visible)
+        self.cutoff_spin.setVisible(visible)
+
+    def preview_cutoff(self, cutoff):
+        """Show the source images scoring above the cutoff, best first, straight from the mapped arrays."""
+        if self.shared_result is None:
+            return
+        source_dir = self.shared_result.handle["source_dir"]
+        names = self.shared_result.names_above(cutoff)
+        self.model.set_images([os.path.join(source_dir, name) for name in names])
+        self.count_label.setText(f"{len(names)} of {len(self.shared_result)} images above {cutoff:g}")
+
+    def open_current_folder(self):
+        if self.open_folder is not None:
+            self.open_folder(self.category_path(self.category_combo.currentText()))
@@ -0,0 +1,117 @@
+"""
+Hierarchical categorization on top of an auto categorization pass.
+
+The embeddings computed for the parent folder are kept with the category
+assignments, so drilling into <target_folder>/<category> selects that category's
+rows of the parent embedding matrix instead of decoding and encoding its images again.
+Rows are keyed by (name, size, mtime_ns) of the parent's files: an image replaced
+since the parent was encoded no longer matches, and is encoded again.
+
+Nested category trees (CATEGORY_TREE) are applied the same way: each level scores
+only the rows of its parent node against the prompts of its children.
+
+    {"pets": {"dogs": "a photo of a dog", "cats": {"kittens": "a photo of a kitten"}}}
+
+A string is the prompt of a leaf; a dict is a subtree whose own prompt is
+LABEL_PROMPT_TEMPLATE filled with its name.
+"""
+
+import numpy as np
+
+from photo_categorizer.config import LABEL_PROMPT_TEMPLATE, THRESHOLD
+from photo_categorizer.logger import logger
+from photo_categorizer.results import materialize
+from photo_categorizer.sources import open_source, source_key, join_location
+
+
+class ParentEmbeddings:
+    """Embedding matrix and category assignments of one auto categorized folder."""
+
+    def __init__(self, root, names, embeddings, assignments, files=None):
+        """files is the [(name, size, mtime_ns)] listing the embeddings were computed from; listed now if None."""
+        self.root = source_key(root)
+        self.names = list(names)
+        self.embeddings = embeddings
+        self.assignments = assignments
+        stats = {name: (size, mtime) for name, size, mtime in
+                 (files if files is not None else open_source(root).list_files())}
+        self._rows = {(name, *stats[name]): row for row, name in enumerate(self.names) if name in stats}
+
+    def rows(self, names, sizes=None):
+        """
+        Row indices of `names`, or None if any of them was not encoded with the parent or
+        its file in the parent changed since. sizes, if given, must match the parent's files too.
+        """
+        current = {name: (size, mtime) for name, size, mtime in open_source(self.root).list_files()}
+        rows = []
+        for index, name in enumerate(names):
+            stat = current.get(name)
+            if stat is None or sizes is not None and sizes[index] != stat[0]:
+                return None
+            row = self._rows.get((name, *stat))
+            if row is None:
+                return None
+            rows.append(row)
+        return np.array(rows, dtype=np.int64)
+
+    def category_rows(self, category):
+        return self.rows(self.assignments.get(category, []))
+
+    def rows_for_folder(self, folder):
+        """
+        Rows of the images currently in a sub-folder of the parent, or None if the folder
+        is empty or holds images the parent never encoded (e.g. files added or replaced
+        after categorization). Copies have their own mtime, so they are matched by size.
+        """
+        files = sorted(open_source(folder).list_files())
+        names = [name for name, _, _ in files]
+        rows = self.rows(names, [size for _, size, _ in files]) if names else None
+        return (names, rows) if rows is not None else (None, None)
+
+
+def node_prompt(name, spec):
+    return spec if isinstance(spec, str) else LABEL_PROMPT_TEMPLATE.format(name)
+
+
+def categorize_tree(model, parent: ParentEmbeddings, tree, mode="copy", threshold=THRESHOLD):
+    """
+    Apply a nested category tree below the parent's category folders.
+    Returns {category: {child: count or nested dict}} for the categories in the tree.
+    """
+    text_cache = {}
+    counts = {}
+    output_root = open_source(parent.root).output_root
+    for category, children in tree.items():
+        rows = parent.category_rows(category)
+        if rows is None or not len(rows) or not isinstance(children, dict):
+            continue
+        folder = join_location(output_root, category)
+        counts[category] = _categorize_node(model, parent, rows, folder, children, mode, threshold, text_cache)
+    return counts
+
+
+def _categorize_node(model, parent, rows, folder, children, mode, threshold, text_cache):
+    """Give each row of a node to its best child above threshold, then recurse into subtrees."""
+    prompts = [node_prompt(name, spec) for name, spec in children.items()]
+    missing = [prompt for prompt in prompts if prompt not in text_cache]
+    if missing:
+        text_cache.update(zip(missing, model.encode_texts(missing)))
+    text_embeddings = np.stack([text_cache[prompt] for prompt in prompts])
+
+    scores = parent.embeddings[rows] @ text_embeddings.T
+    best = np.argmax(scores, axis=1)
+    passed = scores[np.arange(len(rows)), best] > threshold
+
+    counts = {}
+    for column, (name, spec) in enumerate(children.items()):
+        child_rows = rows[passed & (best == column)]
+        child_folder = join_location(folder, name)
+        materialize(folder, child_folder, [parent.names[row] for row in child_rows], mode=mode,
+                    boundary=model.batch_boundary)
+        if isinstance(spec, dict) and len(child_rows):
+            counts[name] = _categorize_node(model, parent, child_rows, child_folder, spec, mode, threshold,
+                                            text_cache)
+        else:
+            counts[name] = len(child_rows)
+    logger.info(f"Categorized {len(rows)} images of {folder} into {len(children)} sub-categories")
+    return counts
@@ -0,0 +1,165 @@
+"""
+Background library indexing.
+
+Crawls the configured library roots at low priority and fills the embedding cache,
+so interactive categorization finds every image already encoded and only looks
+embeddings up. Each indexed folder is also exported as a library index holding its
+fixed-category scores (INDEX_DIR/<digest>), ready to be imported elsewhere.
+
+Categorization outputs are not crawled: the fixed category and events folders, and
+every output folder recorded in a job journal (discovered clusters, searches).
+
+Indexing runs inside the off-peak window, or outside it while the machine is idle.
+It runs as its own process, under nice/ionice and with capped torch threads, so an
+interactive backend on the same machine keeps priority:
+
+    photo-categorizer index ~/Pictures --watch
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime
+
+import psutil
+import torch
+
+from photo_categorizer.config import LIBRARY_ROOTS, INDEXER_WINDOW, INDEXER_IDLE_CPU, INDEXER_INTERVAL, \
+    INDEXER_THREADS, INDEXER_WORKERS, INDEXER_NICE, INDEX_DIR
+from photo_categorizer.jobs import JobJournal
+from photo_categorizer.library_index import LibraryIndex
+from photo_categorizer.logger import logger
+from photo_categorizer.model.BaseModelEngine import BaseModelEngine
+from photo_categorizer.results import is_output_folder
+from photo_categorizer.sources import open_source, is_image_source, is_image_file, source_key
+
+
+def lower_priority(nice=INDEXER_NICE, threads=INDEXER_THREADS):
+    """Run this process at background CPU and I/O priority with at most `threads` torch threads."""
+    process = psutil.Process()
+    try:
+        if os.name == "nt":
+            process.nice(psutil.IDLE_PRIORITY_CLASS)
+        else:
+            process.nice(nice)
+        if hasattr(psutil, "IOPRIO_CLASS_IDLE"):
+            process.ionice(psutil.IOPRIO_CLASS_IDLE)
+    except (psutil.Error, OSError) as e:
+        logger.warning(f"Could not lower indexer priority: {e}")
+    if threads:
+        torch.set_num_threads(threads)
+
+
+def index_path(folder, index_dir=INDEX_DIR):
+    return os.path.join(index_dir, hashlib.sha1(source_key(folder).encode("utf-8")).hexdigest())
+
+
+class LibraryIndexer:
+    def __init__(self, model: BaseModelEngine, roots=None, window=INDEXER_WINDOW, idle_cpu=INDEXER_IDLE_CPU,
+                 interval=INDEXER_INTERVAL, workers=INDEXER_WORKERS, index_dir=INDEX_DIR):
+        self.model = model
+        self.roots = roots or LIBRARY_ROOTS
+        self.window = window
+        self.idle_cpu = idle_cpu
+        self.interval = interval
+        self.workers = workers
+        self.index_dir = index_dir
+        self.stats = {"folders": 0, "indexed": 0, "images": 0, "decoded": 0}
+
+    @staticmethod
+    def job_outputs():
+        """Output folders of the journaled jobs, as source keys."""
+        outputs = set()
+        for journal in JobJournal.all():
+            try:
+                outputs.update(source_key(output) for output in journal.outputs())
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring outputs of job {journal.job_id}: {e}")
+        return outputs
+
+    def folders(self):
+        """
+        Folders and archives below the roots that hold images, skipping categorization outputs:
+        folders marked by materialize, and the outputs of journaled jobs from before the marker.
+        """
+        outputs = self.job_outputs()
+        for root in self.roots:
+            if not os.path.isdir(root):
+                if is_image_source(root):
+                    yield root
+                continue
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith(".")
+                                     and not is_output_folder(os.path.join(dirpath, d))
+                                     and source_key(os.path.join(dirpath, d)) not in outputs)
+                if any(is_image_file(name) for name in filenames):
+                    yield dirpath
+                for name in sorted(filenames):
+                    path = os.path.join(dirpath, name)
+                    if not is_image_file(name) and is_image_source(path):
+                        yield path
+
+    def in_window(self, now=None):
+        if not self.window:
+            return False
+        start, end = self.window
+        hour = (now or datetime.now()).hour
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def allowed(self):
+        """
+        Inside the off-peak window, or outside it while system CPU use stays low. CPU use
+        is averaged since the previous call, so checking between folders never blocks.
+        """
+        return self.in_window() or psutil.cpu_percent(interval=None) < self.idle_cpu
+
+    def is_current(self, folder):
+        """True if every image of the folder is in the embedding cache and the index lists the same files."""
+        files = open_source(folder).list_files()
+        if self.model.embedding_cache is not None:
+            _, _, missed = self.model.embedding_cache.lookup(folder, files)
+            if missed:
+                return False
+        try:
+            index = LibraryIndex.load(index_path(folder, self.index_dir))
+        except (OSError, ValueError, KeyError):
+            return False
+        return index.model_id == self.model.model_id and sorted(index.files) == sorted(files)
+
+    def index_folder(self, folder):
+        try:
+            self.model.load_images_from_directory(folder, workers=self.workers)
+            self.stats["images"] += len(self.model.image_names)
+            self.stats["decoded"] += self.model.load_stats["decoded"]
+            self.model.export_index(index_path(folder, self.index_dir), folder)
+            self.stats["indexed"] += 1
+        except Exception as e:
+            logger.error(f"Failed to index {folder}: {e}")
+        finally:
+            self.model.clean_memory()
+
+    def run_once(self, force=False):
+        """
+        Index every folder that changed since the last crawl. Stops early, returning False,
+        when the window closes and the machine is busy.
+        """
+        if not force:
+            psutil.cpu_percent(interval=1)  # The one blocking sample of the pass; allowed() measures from here
+        for folder in self.folders():
+            self.stats["folders"] += 1
+            if not force and self.is_current(folder):
+                continue
+            if not force and not self.allowed():
+                logger.info("Indexer paused: outside the off-peak window and the machine is busy")
+                return False
+            logger.info(f"Indexing {folder}")
+            self.index_folder(folder)
+        return True
+
+    def run_forever(self):
+        while True:
+            start = time.time()
+            finished = self.run_once()
+            logger.info(f"Indexer pass {'finished' if finished else 'paused'}: {self.stats}")
+            # A paused pass retries soon; a finished one waits for the next scheduled crawl
+            time.sleep(60 if not finished else max(60.0, self.interval - (time.time() - start)))
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from photo_categorizer.config import CACHE_DIR, JOB_MAX_ATTEMPTS, JOB_RETENTION, EVENTS_FOLDER
+from photo_categorizer.logger import logger
+from photo_categorizer.sources import open_source, join_location
+
+JOBS_DIR = os.path.join(CACHE_DIR, "jobs")
+
+UNFINISHED_PHASES = ["started", "encoding", "assigning", "reading_exif", "grouping", "materializing"]
+FAILED_PHASE = "error"  # Resumed only on request, at most JOB_MAX_ATTEMPTS times
+
+
+class JobJournal:
+    """
+    Crash-safe progress record of one backend job, stored as jobs/<job_id>.json.
+    Encoded embeddings are checkpointed separately by the embedding cache; the journal
+    keeps the job parameters, its phase, the category assignments once computed and
+    the output folders already materialized, so a restarted backend can pick up where it stopped.
+    """
+
+    def __init__(self, job_id, kind, status_key, params, state=None, jobs_dir=JOBS_DIR):
+        self.job_id = job_id
+        self.kind = kind
+        self.status_key = status_key
+        self.params = params
+        self.jobs_dir = jobs_dir
+        self.state = state or {"phase": "started", "assignments": None, "materialized": [],
+                               "created": time.time()}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, kind, status_key, params, jobs_dir=JOBS_DIR):
+        cls.prune(jobs_dir)
+        journal = cls(uuid.uuid4().hex, kind, status_key, params, jobs_dir=jobs_dir)
+        journal.save()
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["job_id"], data["kind"], data["status_key"], data["params"], data["state"],
+                   jobs_dir=os.path.dirname(path))
+
+    @classmethod
+    def all(cls, jobs_dir=JOBS_DIR):
+        if not os.path.isdir(jobs_dir):
+            return []
+        journals = []
+        for name in sorted(os.listdir(jobs_dir)):
+            if name.endswith(".json"):
+                try:
+                    journals.append(cls.load(os.path.join(jobs_dir, name)))
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Ignoring unreadable job journal {name}: {e}")
+        return sorted(journals, key=lambda j: j.state.get("created", 0))
+
+    @classmethod
+    def unfinished(cls, jobs_dir=JOBS_DIR, include_failed=False):
+        """Journals of interrupted jobs, plus failed ones with attempts left if include_failed."""
+        return [journal for journal in cls.all(jobs_dir) if journal.phase in UNFINISHED_PHASES or
+                include_failed and journal.phase == FAILED_PHASE and journal.attempts < JOB_MAX_ATTEMPTS]
+
+    @classmethod
+    def prune(cls, jobs_dir=JOBS_DIR, retention=JOB_RETENTION):
+        """Delete journals of jobs that completed or were given up more than `retention` seconds ago."""
+        cutoff = time.time() - retention
+        for journal in cls.all(jobs_dir):
+            done = journal.phase not in UNFINISHED_PHASES and not (
+                journal.phase == FAILED_PHASE and journal.attempts < JOB_MAX_ATTEMPTS)
+            if done and journal.state.get("updated", journal.state.get("created", 0)) < cutoff:
+                try:
+                    os.remove(journal.path)
+                except FileNotFoundError:
+                    pass
+
+    @property
+    def path(self):
+        return os.path.join(self.jobs_dir, self.job_id + ".json")
+
+    @property
+    def phase(self):
+        return self.state["phase"]
+
+    @property
+    def assignments(self):
+        return self.state.get("assignments")
+
+    @property
+    def attempts(self):
+        """Times the job has been started, the first run included."""
+        return self.state.get("attempts", 1)
+
+    def outputs(self):
+        """Output folders of the job, as far as the journal knows them (clusters once assigned)."""
+        root = open_source(self.params["target_folder"]).output_root
+        if self.kind == "search":
+            return [join_location(root, self.params["selected_text"], self.params["output_folder"])]
+        if self.kind == "similar":
+            return [join_location(root, self.params["output_folder"])]
+        if self.kind == "events":
+            return [join_location(root, EVENTS_FOLDER, event) for event in self.assignments or {}]
+        return [join_location(root, category) for category in self.assignments or {}]
+
+    def update(self, **fields):
+        with self._lock:
+            self.state.update(fields)
+            self.state["updated"] = time.time()
+            self.save()
+
+    def mark_materialized(self, output):
+        with self._lock:
+            if output not in self.state["materialized"]:
+                self.state["materialized"].append(output)
+            self.state["updated"] = time.time()
+            self.save()
+
+    def is_materialized(self, output):
+        return output in self.state["materialized"]
+
+    def save(self):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"job_id": self.job_id, "kind": self.kind, "status_key": self.status_key,
+                       "params": self.params, "state": self.state}, f)
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        return {"job_id": self.job_id, "kind": self.kind, "folder": self.status_key, "phase": self.phase,
+                "params": self.params, "materialized": self.state["materialized"], "attempts": self.attempts,
+                "created": self.state.get("created"), "updated": self.state.get("updated")}
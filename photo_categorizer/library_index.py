@@ -0,0 +1,122 @@
+"""
+Portable library index.
+
+A library index is a directory holding everything needed to categorize or search
+a photo library without running the model again:
+
+    manifest.json    format name and version, model id, embedding size, source root,
+                     file manifest (name, size, mtime_ns), category assignments and
+                     the names of the score columns
+    embeddings.npy   float32 (num_files, dim) image embeddings, rows follow the manifest
+    scores.npy       float32 (num_files, num_score_columns) image/text scores
+
+NPY files can be memory mapped on import, so large indexes open instantly.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from photo_categorizer.logger import logger
+from photo_categorizer.sources import open_source
+
+INDEX_FORMAT = "photo-categorizer-index"
+INDEX_VERSION = 1
+
+
+class LibraryIndex:
+    def __init__(self, model_id, root, files, embeddings, categories=None, score_columns=None, scores=None,
+                 created=None):
+        self.model_id = model_id
+        self.root = root
+        self.files = files  # [(name, size, mtime_ns), ...]
+        self.embeddings = embeddings
+        self.categories = categories or {}
+        self.score_columns = score_columns or []
+        self.scores = scores
+        self.created = created or time.time()
+
+    @property
+    def names(self):
+        return [f[0] for f in self.files]
+
+    def manifest(self):
+        return {
+            "format": INDEX_FORMAT,
+            "version": INDEX_VERSION,
+            "model_id": self.model_id,
+            "embedding_dim": int(self.embeddings.shape[1]) if len(self.files) else 0,
+            "created": self.created,
+            "root": self.root,
+            "files": [{"name": name, "size": size, "mtime_ns": mtime} for name, size, mtime in self.files],
+            "categories": self.categories,
+            "score_columns": self.score_columns,
+        }
+
+    @staticmethod
+    def _save_array(path, array):
+        # Replaced, not overwritten: readers may still have the previous file memory mapped
+        tmp_path = path[:-len(".npy")] + ".tmp.npy"
+        np.save(tmp_path, np.asarray(array, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    def save(self, index_path):
+        os.makedirs(index_path, exist_ok=True)
+        # The manifest is removed first and written last, so a readable manifest means a complete index
+        try:
+            os.remove(os.path.join(index_path, "manifest.json"))
+        except FileNotFoundError:
+            pass
+        self._save_array(os.path.join(index_path, "embeddings.npy"), self.embeddings)
+        scores_path = os.path.join(index_path, "scores.npy")
+        if self.scores is not None:
+            self._save_array(scores_path, self.scores)
+        elif os.path.exists(scores_path):
+            os.remove(scores_path)
+        tmp_path = os.path.join(index_path, "manifest.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest(), f)
+        os.replace(tmp_path, os.path.join(index_path, "manifest.json"))
+        logger.info(f"Exported index of {len(self.files)} images to {index_path}")
+
+    @classmethod
+    def load(cls, index_path, mmap=True):
+        with open(os.path.join(index_path, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != INDEX_FORMAT:
+            raise ValueError(f"{index_path} is not a library index.")
+        if manifest.get("version", 0) > INDEX_VERSION:
+            raise ValueError(f"Index version {manifest.get('version')} is newer than supported {INDEX_VERSION}.")
+
+        mmap_mode = "r" if mmap else None
+        embeddings = np.load(os.path.join(index_path, "embeddings.npy"), mmap_mode=mmap_mode)
+        scores_path = os.path.join(index_path, "scores.npy")
+        scores = np.load(scores_path, mmap_mode=mmap_mode) if os.path.exists(scores_path) else None
+        files = [(f["name"], f["size"], f["mtime_ns"]) for f in manifest["files"]]
+        if len(files) != embeddings.shape[0]:
+            raise ValueError(f"Index manifest lists {len(files)} files but holds {embeddings.shape[0]} embeddings.")
+
+        return cls(manifest["model_id"], manifest.get("root"), files, embeddings, manifest.get("categories"),
+                   manifest.get("score_columns"), scores, manifest.get("created"))
+
+
+def seed_embedding_cache(index, embedding_cache, image_dir):
+    """
+    Fill the embedding cache of image_dir from an index, so loading that folder decodes nothing.
+    Files are matched by name and size; the local mtime is used since copies rarely keep it.
+    Returns the number of files seeded.
+    """
+    sizes = {name: size for name, size, _ in index.files}
+    rows = {name: row for row, name in enumerate(index.names)}
+    files, picked = [], []
+    for name, size, mtime in open_source(image_dir).list_files():
+        if sizes.get(name) == size:
+            files.append((name, size, mtime))
+            picked.append(rows[name])
+
+    if files:
+        embedding_cache.store(image_dir, files, np.asarray(index.embeddings[picked]))
+    logger.info(f"Seeded {len(files)} of {len(index.files)} embeddings for {image_dir}")
+    return len(files)
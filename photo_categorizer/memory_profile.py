@@ -0,0 +1,132 @@
+"""
+Memory instrumentation of backend jobs.
+
+Every job records process RSS (and CUDA memory) at each phase it goes through, the
+torch CUDA allocator statistics when a GPU is used and, with MEMORY_TRACEMALLOC,
+the Python allocation sites that grew most between the start and the end of the job.
+Growth that survives `clean_memory` from job to job points at a leak.
+
+Pipeline code marks phases with `mark_phase`, which records into the job profile
+active on the calling thread, if any.
+"""
+
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import torch
+
+from photo_categorizer.config import MEMORY_PROFILE_JOBS, MEMORY_TRACEMALLOC
+from photo_categorizer.model.lifecycle import memory_usage
+
+_local = threading.local()
+
+
+def allocator_stats():
+    """Torch CUDA caching allocator counters in MB, or None without a GPU."""
+    if not torch.cuda.is_available():
+        return None
+    stats = torch.cuda.memory_stats()
+    return {
+        "allocated_mb": stats.get("allocated_bytes.all.current", 0) / 2 ** 20,
+        "reserved_mb": stats.get("reserved_bytes.all.current", 0) / 2 ** 20,
+        "peak_allocated_mb": stats.get("allocated_bytes.all.peak", 0) / 2 ** 20,
+        "alloc_retries": stats.get("num_alloc_retries", 0),
+        "ooms": stats.get("num_ooms", 0),
+    }
+
+
+def mark_phase(phase):
+    """Record memory at a phase change of the job running on this thread."""
+    profile = getattr(_local, "profile", None)
+    if profile is not None:
+        profile.mark(phase)
+
+
+class JobProfile:
+    def __init__(self, kind, key, snapshot=None):
+        self.kind = kind
+        self.key = key
+        self.started = time.time()
+        self.snapshot = snapshot
+        self.phases = []
+        self.mark("start")
+
+    def activate(self):
+        """Make this the profile `mark_phase` records into on the calling thread."""
+        _local.profile = self
+
+    def mark(self, phase):
+        self.phases.append({"phase": phase, "seconds": time.time() - self.started, **memory_usage()})
+
+    def report(self, top_allocations):
+        start, end = self.phases[0], self.phases[-1]
+        return {
+            "kind": self.kind,
+            "key": self.key,
+            "started": self.started,
+            "seconds": end["seconds"],
+            "phases": self.phases,
+            "peak_rss_mb": max(phase["rss_mb"] for phase in self.phases),
+            "rss_growth_mb": end["rss_mb"] - start["rss_mb"],
+            "allocator": allocator_stats(),
+            "top_allocations": top_allocations,
+        }
+
+
+class MemoryProfiler:
+    """Keeps the memory reports of the last `max_jobs` jobs."""
+
+    def __init__(self, max_jobs=MEMORY_PROFILE_JOBS, trace=MEMORY_TRACEMALLOC, top=10):
+        self.trace = trace
+        self.top = top
+        self.jobs = deque(maxlen=max_jobs)
+        self.baseline_rss_mb = None
+        self._lock = threading.Lock()
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    def start_job(self, kind, key):
+        """Start profiling a job and activate it on the calling thread."""
+        snapshot = tracemalloc.take_snapshot() if self.trace else None
+        profile = JobProfile(kind, key, snapshot)
+        with self._lock:
+            if self.baseline_rss_mb is None:
+                self.baseline_rss_mb = profile.phases[0]["rss_mb"]
+        profile.activate()
+        return profile
+
+    def finish_job(self, profile):
+        """Record the job's final memory, after its cleanup, and keep its report."""
+        profile.mark("cleaned")
+        top_allocations = []
+        if profile.snapshot is not None:
+            # Other jobs running at the same time show up here too
+            diff = tracemalloc.take_snapshot().compare_to(profile.snapshot, "lineno")
+            top_allocations = [{"where": str(stat.traceback[0]), "size_kb": stat.size_diff / 1024,
+                                "count": stat.count_diff} for stat in diff[:self.top]]
+            profile.snapshot = None
+        if getattr(_local, "profile", None) is profile:
+            _local.profile = None
+        report = profile.report(top_allocations)
+        with self._lock:
+            self.jobs.append(report)
+        return report
+
+    def status(self):
+        current = memory_usage()
+        with self._lock:
+            status = {
+                "tracemalloc": self.trace,
+                "memory": current,
+                "allocator": allocator_stats(),
+                "baseline_rss_mb": self.baseline_rss_mb,
+                "rss_growth_mb": None if self.baseline_rss_mb is None else current["rss_mb"] - self.baseline_rss_mb,
+                "jobs": list(self.jobs),
+            }
+        if tracemalloc.is_tracing():
+            traced, peak = tracemalloc.get_traced_memory()
+            status["traced_mb"] = traced / 2 ** 20
+            status["traced_peak_mb"] = peak / 2 ** 20
+        return status
@@ -1,15 +1,39 @@
 # photo_categorizer/model/base_model_engine.py
 
+import os
 from abc import ABC, abstractmethod
+from collections import defaultdict
+
+import numpy as np
+
+from photo_categorizer.config import FIXED_CATEGORIES
+from photo_categorizer.library_index import LibraryIndex
+from photo_categorizer.quarantine import split_quarantined, update_report
+from photo_categorizer.results import ScoreResult
+from photo_categorizer.sources import open_source, source_key
+
+
+def new_load_stats():
+    """Images of the current load: from the embedding cache, decoded, and skipped as unreadable."""
+    return {"cached": 0, "decoded": 0, "skipped": 0}
+
 
 class BaseModelEngine(ABC):
     """
     Abstract Base Class for all Model Engines.
     """
+    model_id = None  # Identifies the model in on-disk caches
 
     def __init__(self):
         self.device = None
-        self.image_dict = {}
+        self.image_dict = {}  # Preprocessed images waiting to be encoded
+        self.image_names = []  # Encoded images, aligned with the rows of image_embeddings
+        self.image_embeddings = None
+        self.embedding_cache = None  # Optional EmbeddingCache, lets unchanged images skip decoding
+        self.pending_files = {}  # name -> (image_dir, size, mtime_ns) of images waiting in image_dict
+        self.load_stats = new_load_stats()
+        self.batch_size = 20  # Images per encoder forward pass, tuned per machine by autotune
+        self.batch_hook = None  # Called between encoder batches; the job scheduler preempts bulk jobs there
 
     @abstractmethod
     def load_model(self):
@@ -17,8 +41,42 @@ class BaseModelEngine(ABC):
         pass
 
     @abstractmethod
-    def load_images_from_directory(self, image_dir):
-        """Preload images from directory. Must be implemented by subclass."""
+    def unload_model(self):
+        """Release the model weights and any loaded images."""
+        pass
+
+    @abstractmethod
+    def is_loaded(self):
+        pass
+
+    @abstractmethod
+    def warm_up(self):
+        """Run a throwaway forward pass so the first real request pays no first-inference cost."""
+        pass
+
+    @abstractmethod
+    def load_images_from_directory(self, image_dir, workers, names=None):
+        """Preload images from directory, or only `names` of it. Must be implemented by subclass."""
+        pass
+
+    @abstractmethod
+    def encode_images(self, batch_size):
+        """Encode the images waiting in image_dict and append them to image_embeddings."""
+        pass
+
+    @abstractmethod
+    def run_synthetic_batch(self, batch_size):
+        """Encode a batch of random images; used to time batch sizes."""
+        pass
+
+    @abstractmethod
+    def encode_image_files(self, image_paths):
+        """Return a (len(image_paths), dim) array of embeddings for images outside the library."""
+        pass
+
+    @abstractmethod
+    def encode_texts(self, texts):
+        """Return a (len(texts), dim) array of text embeddings."""
         pass
 
     @abstractmethod
@@ -26,14 +84,163 @@ class BaseModelEngine(ABC):
         pass
 
     @abstractmethod
-    def auto_categorize_image(self):
+    def auto_categorize_image(self, multi_label):
         pass
 
     @abstractmethod
     def clean_memory(self):
         pass
 
+    def add_embeddings(self, names, embeddings):
+        """Append encoded images to the embedding matrix."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.image_embeddings is None or len(self.image_names) == 0:
+            self.image_embeddings = embeddings
+        else:
+            self.image_embeddings = np.concatenate([self.image_embeddings, embeddings])
+        self.image_names.extend(names)
+
+    def batch_boundary(self):
+        if self.batch_hook is not None:
+            self.batch_hook()
+
+    def stash_state(self):
+        """Take the loaded images and embeddings out of the engine, leaving it empty for another job."""
+        state = (self.image_dict, self.image_names, self.image_embeddings, self.pending_files, self.load_stats)
+        self.image_dict, self.image_names, self.image_embeddings = {}, [], None
+        self.pending_files, self.load_stats = {}, new_load_stats()
+        return state
+
+    def restore_state(self, state):
+        """Put back the state taken by stash_state, dropping whatever the engine holds now."""
+        self.image_dict, self.image_names, self.image_embeddings, self.pending_files, self.load_stats = state
+
+    def list_image_files(self, image_dir):
+        """Return [(name, size, mtime_ns), ...] for the images of a directory, archive or objstore:// URI."""
+        return open_source(image_dir).list_files()
+
+    def skip_quarantined(self, image_dir, files):
+        """Drop files quarantined by an earlier load that have not changed since."""
+        files, skipped = split_quarantined(image_dir, files)
+        self.load_stats["skipped"] += len(skipped)
+        return files
+
+    def quarantine_failures(self, image_dir, files, failures):
+        """Record the files of `files` that could not be decoded, [(name, reason, transient)], in the quarantine report."""
+        info = {name: (size, mtime) for name, size, mtime in files}
+        for name, _, _ in failures:
+            self.pending_files.pop(name, None)
+        self.load_stats["skipped"] += len(failures)
+        self.load_stats["decoded"] -= len(failures)
+        update_report(image_dir, list(info), [(name, *info[name], reason, transient)
+                                              for name, reason, transient in failures])
+
+    def take_cached_embeddings(self, image_dir, files):
+        """Add embeddings found in the embedding cache and return the files that still need decoding."""
+        if self.embedding_cache is None:
+            missed = files
+        else:
+            hit_names, hit_embeddings, missed = self.embedding_cache.lookup(image_dir, files)
+            if hit_names:
+                self.add_embeddings(hit_names, hit_embeddings)
+            self.load_stats["cached"] += len(hit_names)
+        self.load_stats["decoded"] += len(missed)
+        for name, size, mtime in missed:
+            self.pending_files[name] = (image_dir, size, mtime)
+        return missed
+
+    def cache_embeddings(self, names, embeddings):
+        """Write freshly encoded embeddings to the embedding cache, one shard per source directory."""
+        by_dir = defaultdict(lambda: ([], []))
+        for name, embedding in zip(names, embeddings):
+            source = self.pending_files.pop(name, None)
+            if source is None:
+                continue
+            image_dir, size, mtime = source
+            by_dir[image_dir][0].append((name, size, mtime))
+            by_dir[image_dir][1].append(embedding)
+
+        if self.embedding_cache is not None:
+            for image_dir, (files, dir_embeddings) in by_dir.items():
+                self.embedding_cache.store(image_dir, files, np.stack(dir_embeddings))
+
+    def score_texts(self, texts, batch_size=None):
+        """
+        Score every loaded image against every text in one matrix multiply.
+        Returns (image_names, scores) where scores has shape (num_images, len(texts)).
+        """
+        self.encode_images(batch_size)
+        if not self.image_names:
+            return [], np.zeros((0, len(texts)), dtype=np.float32)
+        text_embeddings = self.encode_texts(texts)
+        return list(self.image_names), self.image_embeddings @ text_embeddings.T
+
+    def search_similar(self, example_paths=(), text=None, image_weight=1.0, text_weight=1.0,
+                       exclude_examples=True, batch_size=None):
+        """
+        Score the loaded images by similarity to example images, optionally blended with a text query.
+        The query is the weighted sum of the mean unit example embedding and the unit text
+        embedding; scores are 100 * cosine similarity, the same scale as prompt searches.
+        Returns a ScoreResult, so top-k and cutoff selection work as for prompts.
+        """
+        if not example_paths and not text:
+            raise ValueError("At least one example image or a text query is required.")
+        self.encode_images(batch_size)
+
+        query = 0.0
+        parts = []
+        if example_paths:
+            examples = _unit(self.encode_image_files(list(example_paths)))
+            query = query + image_weight * _unit(examples.mean(axis=0))
+            parts.append(f"{len(example_paths)} example images")
+        if text:
+            query = query + text_weight * _unit(self.encode_texts([text])[0])
+            parts.append(text)
+        query = _unit(query)
+        description = " + ".join(parts)
+
+        names = list(self.image_names)
+        if not names:
+            return ScoreResult(description, [], [])
+        scores = 100 * _unit(self.image_embeddings) @ query
+
+        if exclude_examples and example_paths:
+            example_names = {os.path.basename(path) for path in example_paths}
+            keep = np.array([name not in example_names for name in names], dtype=bool)
+            names = [name for name, k in zip(names, keep) if k]
+            scores = scores[keep]
+
+        return ScoreResult(description, names, scores)
+
+    def export_index(self, index_path, image_dir, categories=None, batch_size=None):
+        """
+        Export the images loaded from image_dir as a portable library index, with
+        their embeddings, fixed category scores and optional category assignments.
+        """
+        names, scores = self.score_texts(FIXED_CATEGORIES, batch_size)
+        listed = {f[0]: f for f in self.list_image_files(image_dir)}
+        files = [listed[name] for name in names]
+        index = LibraryIndex(self.model_id, source_key(image_dir), files, self.image_embeddings,
+                             categories, list(FIXED_CATEGORIES), scores)
+        index.save(index_path)
+        return index
+
+    def import_index(self, index_path):
+        """Load the embeddings of a library index, ready for searching without decoding any image."""
+        index = LibraryIndex.load(index_path)
+        if index.model_id != self.model_id:
+            raise ValueError(f"Index was built with {index.model_id}, not {self.model_id}.")
+        if index.files:
+            self.add_embeddings(index.names, index.embeddings)
+        return index
+
     # @abstractmethod
     # def search_images(self, image_dir, image_names, text, output_dir=None, display=False):
     #     """Search images by text. Must be implemented by subclass."""
     #     pass
+
+
+def _unit(vectors):
+    """Scale rows to unit length."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
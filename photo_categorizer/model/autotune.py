@@ -0,0 +1,137 @@
+import json
+import os
+import platform
+import threading
+import time
+
+import psutil
+import torch
+
+from photo_categorizer.config import CACHE_DIR, AUTOTUNE_BATCH_SIZES, AUTOTUNE_MEMORY_FRACTION
+from photo_categorizer.logger import logger
+from photo_categorizer.model.BaseModelEngine import BaseModelEngine
+
+_cache_lock = threading.Lock()
+
+
+def machine_key(engine: BaseModelEngine):
+    """Identify the machine and setup a tuning result is valid for."""
+    device = str(engine.device)
+    if engine.device is not None and engine.device.type == "cuda":
+        device = torch.cuda.get_device_name(engine.device)
+    total_mb = psutil.virtual_memory().total // 2 ** 20
+    return f"{platform.node()}|{engine.model_id}|{device}|cpus={os.cpu_count()}|ram={total_mb}|torch={torch.__version__}"
+
+
+def thread_candidates():
+    """Physical and logical core counts, plus half the physical cores."""
+    logical = os.cpu_count() or 1
+    physical = psutil.cpu_count(logical=False) or logical
+    return sorted({max(1, physical // 2), physical, logical})
+
+
+def memory_budget_mb(engine: BaseModelEngine, fraction=AUTOTUNE_MEMORY_FRACTION):
+    if engine.device is not None and engine.device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info(engine.device)
+        return free * fraction / 2 ** 20
+    return psutil.virtual_memory().available * fraction / 2 ** 20
+
+
+def _used_mb(engine, baseline_mb):
+    """Memory the trials added on top of the baseline (peak on CUDA, RSS growth on CPU)."""
+    if engine.device is not None and engine.device.type == "cuda":
+        return torch.cuda.max_memory_allocated(engine.device) / 2 ** 20 - baseline_mb
+    return max(0.0, psutil.Process().memory_info().rss / 2 ** 20 - baseline_mb)
+
+
+def _baseline_mb(engine):
+    if engine.device is not None and engine.device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(engine.device)
+        return torch.cuda.memory_allocated(engine.device) / 2 ** 20
+    return psutil.Process().memory_info().rss / 2 ** 20
+
+
+def _time_batch(engine, batch_size, repeats):
+    engine.run_synthetic_batch(batch_size)  # First call at a new size pays allocation costs
+    start = time.perf_counter()
+    for _ in range(repeats):
+        engine.run_synthetic_batch(batch_size)
+    return batch_size * repeats / (time.perf_counter() - start)
+
+
+def measure(engine: BaseModelEngine, batch_sizes=AUTOTUNE_BATCH_SIZES, repeats=2):
+    """
+    Time every (threads, batch size) pair that fits the memory budget.
+    Batch sizes are tried in increasing order and a size is skipped as soon as the
+    memory measured for smaller batches predicts it would not fit, so the machine never swaps.
+    The baseline, the per-image estimate and the largest size that fits are shared by
+    all thread counts, so later thread counts never retry a size known not to fit.
+    """
+    budget_mb = memory_budget_mb(engine)
+    on_cuda = engine.device is not None and engine.device.type == "cuda"
+    original_threads = torch.get_num_threads()
+    trials = []
+    best = None
+    baseline_mb = _baseline_mb(engine)
+    per_image_mb = 0.0
+    too_large = None  # Smallest batch size that did not fit
+
+    for threads in ([original_threads] if on_cuda else thread_candidates()):
+        torch.set_num_threads(threads)
+        for batch_size in sorted(batch_sizes):
+            if too_large is not None and batch_size >= too_large or \
+                    per_image_mb and per_image_mb * batch_size > budget_mb:
+                break
+            throughput = _time_batch(engine, batch_size, repeats)
+            used_mb = _used_mb(engine, baseline_mb)
+            per_image_mb = max(per_image_mb, used_mb / batch_size)
+            fits = used_mb <= budget_mb
+            trials.append({"threads": threads, "batch_size": batch_size,
+                           "images_per_second": throughput, "memory_mb": used_mb, "fits": fits})
+            if not fits:
+                too_large = batch_size
+                break
+            if best is None or throughput > best["images_per_second"]:
+                best = {"threads": threads, "batch_size": batch_size, "images_per_second": throughput}
+
+    torch.set_num_threads(original_threads)
+    if best is None:
+        best = {"threads": original_threads, "batch_size": min(batch_sizes), "images_per_second": None}
+    return {**best, "memory_budget_mb": budget_mb, "trials": trials, "tuned_at": time.time()}
+
+
+def autotune(engine: BaseModelEngine, cache_dir=None, force=False, batch_size=None):
+    """
+    Pick the fastest batch size and thread count for this machine and apply them.
+    With a fixed batch_size only the thread counts are timed, at that size.
+    Results are cached per machine, so only the first model load pays for the timing runs.
+    """
+    cache_path = os.path.join(cache_dir or CACHE_DIR, "autotune.json")
+    key = machine_key(engine) if batch_size is None else f"{machine_key(engine)}|batch={batch_size}"
+
+    with _cache_lock:
+        cached = {}
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding="utf-8") as f:
+                    cached = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable autotune cache {cache_path}: {e}")
+
+        result = None if force else cached.get(key)
+        if result is None:
+            logger.info("Autotuning encoder batch size and threads...")
+            result = measure(engine) if batch_size is None else measure(engine, batch_sizes=[batch_size])
+            cached[key] = result
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cached, f, indent=2)
+            os.replace(tmp_path, cache_path)
+
+    engine.batch_size = result["batch_size"]
+    if engine.device is None or engine.device.type != "cuda":
+        torch.set_num_threads(result["threads"])
+    logger.info(f"Using batch size {result['batch_size']} with {result['threads']} threads "
+                f"({result['images_per_second']} images/s)")
+    return {**result, "key": key}
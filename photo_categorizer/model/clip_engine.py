@@ -1,22 +1,33 @@
-import os
+import gc
 from collections import defaultdict
 
 import torch
 from qai_hub_models.models.openai_clip.app import ClipApp
 from qai_hub_models.models.openai_clip.model import Clip
-from qai_hub_models.utils.asset_loaders import load_image
 from photo_categorizer.logger import logger
-from photo_categorizer.model.BaseModelEngine import BaseModelEngine
-from photo_categorizer.config import FIXED_CATEGORIES, MAX_TOTAL_CATEGORIES, THRESHOLD
+from photo_categorizer.model.BaseModelEngine import BaseModelEngine, new_load_stats
+from photo_categorizer.model.decode_pool import DecodePool
+from photo_categorizer.model.embedding_cache import EmbeddingCache
+from photo_categorizer.model.label_bank import LabelBank
+from photo_categorizer.model.model_types import ModelTypes
+from photo_categorizer.config import FIXED_CATEGORIES, MAX_TOTAL_CATEGORIES, THRESHOLD, LOADER_WORKERS, EMBEDDING_CACHE, \
+    CHECKPOINT_INTERVAL, CATEGORY_THRESHOLDS, MULTI_LABEL
+from photo_categorizer.results import ScoreResult
+from photo_categorizer.sources import open_source, decode_image, select_files
 import numpy as np
 from collections import Counter
 
 
 class ClipEngine(BaseModelEngine):
+    model_id = ModelTypes.CLIP.value
+
     def __init__(self):
         super().__init__()  # Initialize BaseModelEngine attributes
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.app = None
+        self.label_bank = None
+        if EMBEDDING_CACHE:
+            self.embedding_cache = EmbeddingCache(self.model_id)
         self.load_model()
 
     def load_model(self):
@@ -25,42 +36,95 @@ class ClipEngine(BaseModelEngine):
         self.app = ClipApp(clip_model=clip_model)
         logger.info(f"Model loaded and running on {self.device}")
 
-    def load_images_from_directory(self, image_dir):
-        """Preload images into memory for future searches."""
-        logger.info(f"Loading images from: {image_dir}")
+    def unload_model(self):
+        self.clean_memory()
+        self.app = None
+        self.label_bank = None
+        logger.info("Model unloaded")
 
-        for filename in os.listdir(image_dir):
-            ext = os.path.splitext(filename)[1].lower()
-            if ext in [".jpg", ".jpeg", ".png"]:
-                image_path = os.path.join(image_dir, filename)
-                image_tensor = self.app.process_image(load_image(image_path)).to(self.device)
-                self.image_dict[filename] = image_tensor
+    def is_loaded(self):
+        return self.app is not None
 
-        logger.info(f"Loaded {len(self.image_dict)} images.")
+    def warm_up(self):
+        """Encode a blank image and a short text once."""
+        with torch.no_grad():
+            blank = torch.zeros(1, 3, 224, 224, device=self.device)
+            self.app.image_encoder(blank)
+            self.app.text_encoder(self.app.process_text("a photo").to(self.device))
 
-    def search_images(self, prompt, batch_size=20):
+    def load_images_from_directory(self, image_dir, workers=LOADER_WORKERS, names=None):
         """
-        Search for images matching the text prompt in batches.
-        Returns a list of (image_name, similarity_score).
+        Preload images into memory for future searches.
+        image_dir may be a directory, a ZIP/TAR archive or an objstore:// URI; archives are
+        read in one sequential pass without extracting them.
+        Images found in the embedding cache are not decoded at all. The rest are decoded
+        by a pool of worker threads in chunks of CHECKPOINT_INTERVAL images; while one
+        chunk is encoded (and checkpointed to the embedding cache) the next is decoded.
+        Files that fail to decode, or exceed the pixel or time limits, are skipped and
+        quarantined; files quarantined before are not read again until they change.
+        If names is given, only those images of the source are loaded (one shard of it).
         """
-        return self._search_images(prompt, self.image_dict, batch_size)
+        logger.info(f"Loading images from: {image_dir}")
 
-    def _search_images(self, prompt, image_dict, batch_size=20):
-        text_tensor = self.app.process_text(prompt).to(self.device)
-        image_items = list(image_dict.items())
-        image_tensors = torch.stack([img for _, img in image_items]).squeeze(1)
-        image_names = [name for name, _ in image_items]
+        source = open_source(image_dir)
+        files = self.skip_quarantined(image_dir, select_files(source.list_files(), names))
+        files = self.take_cached_embeddings(image_dir, files)
+        payloads = source.iter_payloads([f[0] for f in files])
 
-        results = []
-        num_images = image_tensors.shape[0]
+        def process(payload):
+            return self.app.process_image(decode_image(payload)).to(self.device)
 
-        for i in range(0, num_images, batch_size):
-            batch_images = image_tensors[i:i + batch_size]
-            predictions = self.app.predict_similarity(batch_images, text_tensor).flatten().tolist()
-            batch_results = list(zip(image_names[i:i + batch_size], predictions))
-            results.extend(batch_results)
+        pool = DecodePool(process, workers)
+        for decoded in pool.chunks(payloads, CHECKPOINT_INTERVAL):
+            for filename, image_tensor in decoded:
+                self.image_dict[filename] = image_tensor
+            self.encode_images()
+        self.quarantine_failures(image_dir, files, pool.failures)
 
-        return results
+        logger.info(f"Loaded {len(self.image_names)} images, {self.load_stats['cached']} from embedding cache, "
+                    f"{self.load_stats['skipped']} skipped.")
+
+    def encode_images(self, batch_size=None):
+        """
+        Encode pending images in batches. Each image is encoded once; its preprocessed
+        tensor is dropped afterwards so only the small embedding stays in memory.
+        """
+        if not self.image_dict:
+            return
+        batch_size = batch_size or self.batch_size
+        names = list(self.image_dict.keys())
+        first_row = len(self.image_names)
+        with torch.no_grad():
+            for i in range(0, len(names), batch_size):
+                batch_names = names[i:i + batch_size]
+                batch_images = torch.cat([self.image_dict.pop(name) for name in batch_names])
+                embeddings = self.app.image_encoder(batch_images).cpu().numpy()
+                self.add_embeddings(batch_names, embeddings)
+                self.batch_boundary()
+        self.cache_embeddings(names, self.image_embeddings[first_row:])
+        logger.info(f"Encoded {len(names)} images.")
+
+    def encode_image_files(self, image_paths):
+        with torch.no_grad():
+            images = torch.cat([self.app.process_image(decode_image(path)) for path in image_paths]).to(self.device)
+            return self.app.image_encoder(images).cpu().numpy().astype(np.float32)
+
+    def run_synthetic_batch(self, batch_size):
+        with torch.no_grad():
+            self.app.image_encoder(torch.rand(batch_size, 3, 224, 224, device=self.device))
+
+    def encode_texts(self, texts):
+        with torch.no_grad():
+            text_tensor = torch.cat([self.app.process_text(text) for text in texts]).to(self.device)
+            return self.app.text_encoder(text_tensor).cpu().numpy().astype(np.float32)
+
+    def search_images(self, prompt, batch_size=None):
+        """
+        Score every loaded image against the text prompt.
+        Returns a ScoreResult holding the full score vector.
+        """
+        image_names, scores = self.score_texts([prompt], batch_size)
+        return ScoreResult(prompt, image_names, scores[:, 0])
 
     def _bpe_cluster(self, features, max_clusters):
         """BPE-like clustering with cosine similarity"""
@@ -97,23 +161,26 @@ class ClipEngine(BaseModelEngine):
 
         return clusters
 
-    def auto_categorize_image(self):
-        unprocessed_dict = self.image_dict.copy()
-        fixed_members = defaultdict(list)
-        fixed_names = defaultdict(list)
-        for category in FIXED_CATEGORIES:
-            members = self._search_images(category, unprocessed_dict)
-            fixed_names[category] = [m[0] for m in members if m[1] > THRESHOLD]
-            unprocessed_dict = {key: value for key, value in unprocessed_dict.items() if
-                                key not in fixed_names[category]}
+    def auto_categorize_image(self, multi_label=MULTI_LABEL):
+        # 1. Score every image against every fixed category at once
+        image_names, scores = self.score_texts(FIXED_CATEGORIES)
+        thresholds = np.array([CATEGORY_THRESHOLDS.get(c, THRESHOLD) for c in FIXED_CATEGORIES], dtype=np.float32)
+        passed = scores > thresholds
 
-        remaining_features = []
-        remaining_names = list(self.image_dict.keys())
-        for k, v in fixed_names.items():
-            remaining_names = list(set(remaining_names) - set(v))
+        # 2. Multi-label keeps every category an image passes; otherwise only the first (in order)
+        if multi_label:
+            assigned = passed
+        else:
+            assigned = np.zeros_like(passed)
+            assigned[np.arange(len(image_names)), np.argmax(passed, axis=1)] = True
+            assigned &= passed
 
-        for name in remaining_names:
-            remaining_features.append(self.image_dict[name])
+        fixed_names = defaultdict(list)
+        for column, category in enumerate(FIXED_CATEGORIES):
+            fixed_names[category] = [image_names[i] for i in np.flatnonzero(assigned[:, column])]
+
+        remaining_rows = np.flatnonzero(~passed.any(axis=1))
+        remaining_names = [image_names[i] for i in remaining_rows]
 
         # 3. Calculate remaining cluster allowance
         remaining_clusters = MAX_TOTAL_CATEGORIES - len(FIXED_CATEGORIES)
@@ -122,21 +189,37 @@ class ClipEngine(BaseModelEngine):
             remaining_clusters = 1
 
         # 4. BPE-like clustering for remaining images
-        if len(remaining_features) > 0:
-            remaining_features = np.vstack(remaining_features)
+        if len(remaining_rows) > 0:
+            remaining_features = self.image_embeddings[remaining_rows]
             clusters = self._bpe_cluster(remaining_features, remaining_clusters)
 
             # Create cluster names
-            cluster_labels = ["other" for i in range(len(clusters))]
+            cluster_labels = self._name_clusters(remaining_features, clusters)
 
-            # Assign images to clusters
+            # Assign images to clusters; clusters too vague to name share "other"
             for cluster, label in zip(clusters, cluster_labels):
-                fixed_names[label] = [remaining_names[i] for i in cluster["indices"]]
+                fixed_names[label].extend(remaining_names[i] for i in cluster["indices"])
 
         return fixed_names
 
+    def _name_clusters(self, features, clusters):
+        """Name each cluster after the label bank entry closest to its centroid."""
+        if self.label_bank is None:
+            self.label_bank = LabelBank(self)
+        unit_features = features / np.linalg.norm(features, axis=1, keepdims=True)
+        centroids = np.stack([unit_features[list(cluster["indices"])].mean(axis=0) for cluster in clusters])
+        return self.label_bank.name_clusters(centroids, exclude=FIXED_CATEGORIES)
+
     def clean_memory(self):
         self.image_dict.clear()
+        self.pending_files.clear()
+        self.image_names = []
+        self.image_embeddings = None
+        self.load_stats = new_load_stats()
+        # Batches and preprocessed tensors can sit in reference cycles; give their memory back now
+        gc.collect()
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
 
 if __name__ == '__main__':
     clip_engine = ClipEngine()
@@ -0,0 +1,87 @@
+"""
+Image decoding on worker threads with per-file fault isolation.
+
+A file whose decode raises (corrupt, truncated, over MAX_IMAGE_PIXELS, unreadable
+archive member) is recorded in `failures` and skipped; the rest of the load goes on.
+A decode running longer than DECODE_TIMEOUT is skipped too. A thread stuck in it
+cannot be interrupted, so the pool leaves it behind and continues on fresh threads
+at full width. Timeouts and I/O errors are marked transient: the file may well load
+on a later try.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from photo_categorizer.config import DECODE_TIMEOUT, CHECKPOINT_INTERVAL
+from photo_categorizer.logger import logger
+
+POLL_SECONDS = 0.5  # How often a slow decode is checked against the timeout
+
+
+class DecodeTimeout(Exception):
+    pass
+
+
+def is_transient(error):
+    """Timeouts and OS-level I/O errors (which carry an errno); format errors fail the same way every time."""
+    return isinstance(error, DecodeTimeout) or isinstance(error, OSError) and error.errno is not None
+
+
+class DecodePool:
+    def __init__(self, process, workers, timeout=DECODE_TIMEOUT):
+        self.process = process
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.started = {}  # name -> monotonic time its decode started
+        self.failures = []  # (name, reason, transient)
+        self.abandoned = 0  # Pools left behind with a hanging decode
+
+    def _run(self, name, payload):
+        self.started[name] = time.monotonic()
+        return self.process(payload)
+
+    def _submit(self, payloads, count):
+        return [(name, self.executor.submit(self._run, name, payload)) for name, payload in islice(payloads, count)]
+
+    def _result(self, name, future):
+        """Wait for one decode; only time spent decoding (not queued) counts against the timeout."""
+        while True:
+            try:
+                return future.result(timeout=POLL_SECONDS)
+            except TimeoutError:
+                started = self.started.get(name)
+                if started is not None and time.monotonic() - started > self.timeout:
+                    raise DecodeTimeout(f"decoding took longer than {self.timeout}s")
+
+    def _collect(self, pending):
+        decoded = []
+        stuck = False
+        for name, future in pending:
+            try:
+                decoded.append((name, self._result(name, future)))
+            except DecodeTimeout as e:
+                self.failures.append((name, str(e), True))
+                stuck = True
+            except Exception as e:
+                self.failures.append((name, f"{type(e).__name__}: {e}", is_transient(e)))
+            self.started.pop(name, None)
+        if stuck:
+            logger.warning("Leaving a hanging decode behind, continuing on a fresh decoding pool")
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            self.abandoned += 1
+        return decoded
+
+    def chunks(self, payloads, chunk_size=CHECKPOINT_INTERVAL):
+        """Yield lists of (name, result) per chunk; the next chunk decodes while the caller handles one."""
+        payloads = iter(payloads)
+        pending = self._submit(payloads, chunk_size)
+        try:
+            while pending:
+                decoded = self._collect(pending)
+                pending = self._submit(payloads, chunk_size)
+                yield decoded
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
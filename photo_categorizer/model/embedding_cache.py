@@ -0,0 +1,113 @@
+import glob
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from photo_categorizer.config import CACHE_DIR
+from photo_categorizer.logger import logger
+from photo_categorizer.sources import source_key
+
+MAX_PARTS = 16  # Part files per shard before they are compacted into one
+
+
+class EmbeddingCache:
+    """
+    On-disk image embedding cache, one shard per model and source directory.
+    Entries are keyed by file name, size and modification time, so edited files are
+    re-encoded while unchanged ones are looked up without decoding the image.
+
+    A shard is a directory of append-only part files: storing a checkpoint writes only
+    the new embeddings, and parts are compacted once there are more than MAX_PARTS.
+    """
+
+    def __init__(self, model_id, cache_dir=None):
+        self.model_id = model_id
+        self.cache_dir = os.path.join(cache_dir or os.path.join(CACHE_DIR, "embeddings"), model_id)
+        self._lock = threading.Lock()
+
+    def shard_path(self, image_dir):
+        digest = hashlib.sha1(source_key(image_dir).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest)
+
+    def _part_paths(self, image_dir):
+        return sorted(glob.glob(os.path.join(self.shard_path(image_dir), "part-*.npz")))
+
+    def _read_shard(self, image_dir):
+        """Merge all parts of a shard; entries in later parts replace earlier ones."""
+        parts = []
+        for path in self._part_paths(image_dir):
+            try:
+                with np.load(path) as data:
+                    parts.append({key: data[key] for key in ("names", "sizes", "mtimes", "embeddings")})
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable embedding cache part {path}: {e}")
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+
+        merged = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+        last_row = {name: row for row, name in enumerate(merged["names"].tolist())}
+        keep = np.array(sorted(last_row.values()), dtype=np.int64)
+        return {key: value[keep] for key, value in merged.items()}
+
+    def lookup(self, image_dir, files):
+        """
+        Split `files` [(name, size, mtime_ns), ...] into cached embeddings and misses.
+        Returns (hit_names, hit_embeddings, missed_files).
+        """
+        shard = self._read_shard(image_dir)
+        if shard is None:
+            return [], None, list(files)
+
+        rows = {name: row for row, name in enumerate(shard["names"].tolist())}
+        hit_names, hit_rows, missed = [], [], []
+        for name, size, mtime in files:
+            row = rows.get(name)
+            if row is not None and shard["sizes"][row] == size and shard["mtimes"][row] == mtime:
+                hit_names.append(name)
+                hit_rows.append(row)
+            else:
+                missed.append((name, size, mtime))
+
+        hit_embeddings = shard["embeddings"][hit_rows] if hit_rows else None
+        return hit_names, hit_embeddings, missed
+
+    def store(self, image_dir, files, embeddings):
+        """Add or replace entries for `files` [(name, size, mtime_ns), ...] in a directory shard."""
+        if not files:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            shard_dir = self.shard_path(image_dir)
+            os.makedirs(shard_dir, exist_ok=True)
+            self._write_part(shard_dir, [f[0] for f in files], [f[1] for f in files], [f[2] for f in files],
+                             embeddings)
+            parts = self._part_paths(image_dir)
+            if len(parts) > MAX_PARTS:
+                self._compact(image_dir, shard_dir, parts)
+
+    def _compact(self, image_dir, shard_dir, parts):
+        # Other processes (the indexer, worker backends) share the cache and may compact the same shard
+        shard = self._read_shard(image_dir)
+        if shard is None:
+            return
+        self._write_part(shard_dir, shard["names"].tolist(), shard["sizes"], shard["mtimes"], shard["embeddings"])
+        for path in parts:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write_part(shard_dir, names, sizes, mtimes, embeddings):
+        # Time-ordered names keep parts sorted oldest first
+        name = f"part-{time.time_ns():020d}-{threading.get_ident()}.npz"
+        path = os.path.join(shard_dir, name)
+        tmp_path = os.path.join(shard_dir, "tmp-" + name)
+        np.savez(tmp_path, names=np.array(names, dtype=str), sizes=np.asarray(sizes, dtype=np.int64),
+                 mtimes=np.asarray(mtimes, dtype=np.int64), embeddings=embeddings)
+        os.replace(tmp_path, path)
@@ -0,0 +1,96 @@
+import hashlib
+import os
+
+import numpy as np
+
+from photo_categorizer.config import CACHE_DIR, LABEL_BANK_FILE, LABEL_PROMPT_TEMPLATE, CLUSTER_LABEL_MIN_SCORE
+from photo_categorizer.logger import logger
+
+
+def read_labels(path=LABEL_BANK_FILE):
+    """Read candidate labels, one per line; blank lines and # comments are skipped."""
+    labels = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            label = line.strip()
+            if label and not label.startswith("#") and label not in seen:
+                seen.add(label)
+                labels.append(label)
+    return labels
+
+
+class LabelBank:
+    """
+    Text embeddings of a candidate label vocabulary, used to name image clusters.
+    The embeddings are computed once per model and vocabulary and cached on disk,
+    so naming clusters costs a single matrix multiply per run.
+    """
+
+    def __init__(self, engine, labels=None, cache_dir=None, batch_size=256):
+        self.engine = engine
+        self.labels = labels if labels is not None else read_labels()
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, "label_bank")
+        self.batch_size = batch_size
+        self._embeddings = None
+
+    def cache_path(self):
+        key = "\n".join([self.engine.model_id, LABEL_PROMPT_TEMPLATE] + self.labels)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{self.engine.model_id}-{digest}.npy")
+
+    @property
+    def embeddings(self):
+        """(num_labels, dim) unit-length label embeddings."""
+        if self._embeddings is None:
+            self._embeddings = self._load_or_encode()
+        return self._embeddings
+
+    def _load_or_encode(self):
+        path = self.cache_path()
+        if os.path.exists(path):
+            return np.load(path)
+
+        logger.info(f"Encoding label bank of {len(self.labels)} labels")
+        prompts = [LABEL_PROMPT_TEMPLATE.format(label) for label in self.labels]
+        embeddings = np.concatenate([
+            self.engine.encode_texts(prompts[i:i + self.batch_size])
+            for i in range(0, len(prompts), self.batch_size)
+        ]).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, embeddings)
+        os.replace(tmp_path, path)
+        return embeddings
+
+    def name_clusters(self, centroids, exclude=(), min_score=CLUSTER_LABEL_MIN_SCORE, fallback="other"):
+        """
+        Pick a distinct label for each cluster centroid.
+        Centroids are means of unit image embeddings, so a tight cluster scores higher
+        than a diffuse one; clusters scoring below `min_score` get the fallback name.
+        """
+        centroids = np.atleast_2d(np.asarray(centroids, dtype=np.float32))
+        # Same scale as image/text scores (100 * cosine), so min_score is comparable to THRESHOLD
+        scores = 100 * centroids @ self.embeddings.T
+
+        excluded = set(exclude) | {fallback}
+        usable = np.array([label not in excluded for label in self.labels])
+        scores[:, ~usable] = -np.inf
+
+        # Greedy assignment: best (cluster, label) pair first, each label used once
+        names = [fallback] * len(centroids)
+        assigned = np.zeros(len(centroids), dtype=bool)
+        used = set()
+        for flat in np.argsort(-scores, axis=None):
+            cluster, label = divmod(int(flat), scores.shape[1])
+            if assigned[cluster] or label in used:
+                continue
+            assigned[cluster] = True
+            if scores[cluster, label] >= min_score:
+                names[cluster] = self.labels[label]
+                used.add(label)
+            if assigned.all():
+                break
+        return names
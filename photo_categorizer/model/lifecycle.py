@@ -0,0 +1,153 @@
+import gc
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psutil
+import torch
+
+from photo_categorizer.config import MODEL_IDLE_TIMEOUT, MODEL_WARMUP, AUTOTUNE
+from photo_categorizer.logger import logger
+from photo_categorizer.model.BaseModelEngine import BaseModelEngine
+from photo_categorizer.model.autotune import autotune
+
+
+def memory_usage():
+    """Current process RSS and allocated CUDA memory in MB."""
+    usage = {"rss_mb": psutil.Process().memory_info().rss / 2 ** 20}
+    if torch.cuda.is_available():
+        usage["cuda_mb"] = torch.cuda.memory_allocated() / 2 ** 20
+    return usage
+
+
+class ModelLifecycle:
+    """
+    Keeps a model engine warm while it is used and gives its memory back when idle.
+    Jobs wrap their model use in `in_use()`; once no job has used the model for
+    `idle_timeout` seconds the model and loaded embeddings are unloaded, and the
+    next `in_use()` reloads it transparently.
+    """
+
+    def __init__(self, engine: BaseModelEngine, idle_timeout=MODEL_IDLE_TIMEOUT, warmup=MODEL_WARMUP,
+                 tune=AUTOTUNE):
+        self.engine = engine
+        self.idle_timeout = idle_timeout
+        self.warmup = warmup
+        self.tune = tune
+        self.tuning = None
+        self.events = deque(maxlen=20)
+        self.on_unload = []  # Callables dropping state derived from the model, e.g. cached embeddings
+        self._lock = threading.RLock()
+        self._active = 0
+        self._timer = None
+        self.last_used = time.time()
+
+        if self.warmup:
+            self._transition("warmup", self.engine.warm_up)
+        if self.tune:
+            self._transition("autotune", self._autotune)
+        self._schedule_unload()
+
+    @property
+    def loaded(self):
+        return self.engine.is_loaded()
+
+    def acquire(self):
+        """Mark the model busy, reloading it first if it was unloaded."""
+        with self._lock:
+            self._active += 1
+            self._cancel_timer()
+            if not self.engine.is_loaded():
+                self._transition("load", self.engine.load_model)
+                if self.warmup:
+                    self._transition("warmup", self.engine.warm_up)
+                if self.tune:
+                    self._autotune()  # Cached per machine, so this only re-applies the result
+
+    def release(self):
+        """Mark one job done; the idle timer starts once no job uses the model."""
+        with self._lock:
+            self._active = max(0, self._active - 1)
+            self.last_used = time.time()
+            if self._active == 0:
+                self._schedule_unload()
+
+    @contextmanager
+    def in_use(self):
+        self.acquire()
+        try:
+            yield self.engine
+        finally:
+            self.release()
+
+    def unload(self):
+        """Unload the model now unless a job is using it. Returns True if unloaded."""
+        with self._lock:
+            if self._active > 0 or not self.engine.is_loaded():
+                return False
+            self._transition("unload", self._release_memory)
+            return True
+
+    def status(self):
+        with self._lock:
+            return {
+                "loaded": self.engine.is_loaded(),
+                "active_jobs": self._active,
+                "idle_seconds": time.time() - self.last_used,
+                "idle_timeout": self.idle_timeout,
+                "memory": memory_usage(),
+                "tuning": self.tuning,
+                "events": list(self.events),
+            }
+
+    def _autotune(self):
+        self.tuning = autotune(self.engine)
+
+    def _release_memory(self):
+        for callback in self.on_unload:
+            callback()
+        self.engine.unload_model()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _transition(self, name, action):
+        """Run a lifecycle step and record its latency and memory change."""
+        before = memory_usage()
+        start = time.perf_counter()
+        action()
+        seconds = time.perf_counter() - start
+        after = memory_usage()
+        event = {
+            "event": name,
+            "time": time.time(),
+            "seconds": seconds,
+            "rss_mb": after["rss_mb"],
+            "rss_delta_mb": after["rss_mb"] - before["rss_mb"],
+        }
+        if "cuda_mb" in after:
+            event["cuda_mb"] = after["cuda_mb"]
+            event["cuda_delta_mb"] = after["cuda_mb"] - before["cuda_mb"]
+        self.events.append(event)
+        logger.info(f"Model {name} took {seconds:.2f}s, RSS {after['rss_mb']:.0f} MB "
+                    f"({event['rss_delta_mb']:+.0f} MB)")
+
+    def _schedule_unload(self):
+        self._cancel_timer()
+        if not self.idle_timeout:
+            return
+        self._timer = threading.Timer(self.idle_timeout, self._on_idle)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_idle(self):
+        with self._lock:
+            if self._active == 0 and time.time() - self.last_used >= self.idle_timeout:
+                logger.info(f"Model idle for {self.idle_timeout}s, unloading.")
+                self.unload()
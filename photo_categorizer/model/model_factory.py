@@ -1,9 +1,12 @@
 from photo_categorizer.model.model_types import ModelTypes
 from photo_categorizer.model.clip_engine import ClipEngine
+from photo_categorizer.model.stub_engine import StubEngine
+from photo_categorizer.model.lifecycle import ModelLifecycle
 from photo_categorizer.logger import logger
 
 class ModelFactory:
     _instances = {}  # Cache to hold singleton instances of models
+    _lifecycles = {}  # Warm-up and idle unload management per cached model
 
     @staticmethod
     def get_model(model_type: str):
@@ -19,6 +22,8 @@ class ModelFactory:
 
         if model_type == ModelTypes.CLIP.value:
             model = ClipEngine()
+        elif model_type == ModelTypes.STUB.value:
+            model = StubEngine()
         else:
             raise ValueError(f"Unsupported model type: {model_type}")
 
@@ -26,3 +31,13 @@ class ModelFactory:
         ModelFactory._instances[model_type] = model
         logger.info(f"Model {model_type} loaded successfully and cached.")
         return model
+
+    @staticmethod
+    def get_lifecycle(model_type: str):
+        """
+        Return the lifecycle manager of a model, loading and warming up the model if needed.
+        """
+        if model_type not in ModelFactory._lifecycles:
+            model = ModelFactory.get_model(model_type)
+            ModelFactory._lifecycles[model_type] = ModelLifecycle(model)
+        return ModelFactory._lifecycles[model_type]
@@ -2,3 +2,4 @@ from enum import Enum
 
 class ModelTypes(Enum):
     CLIP = "clip"
+    STUB = "stub"  # Model-free engine for soak tests and local multi-process setups
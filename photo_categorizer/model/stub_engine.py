@@ -0,0 +1,117 @@
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+
+from photo_categorizer.config import FIXED_CATEGORIES, THRESHOLD, LOADER_WORKERS, CATEGORY_THRESHOLDS, MULTI_LABEL
+from photo_categorizer.logger import logger
+from photo_categorizer.model.BaseModelEngine import BaseModelEngine, _unit, new_load_stats
+from photo_categorizer.model.decode_pool import DecodePool
+from photo_categorizer.model.model_types import ModelTypes
+from photo_categorizer.results import ScoreResult
+from photo_categorizer.sources import open_source, decode_image, select_files
+
+PIXELS = 16  # Images are reduced to PIXELS x PIXELS before the random projection
+
+
+class StubEngine(BaseModelEngine):
+    """
+    Model-free engine for soak tests and multi-process setups.
+    Images are decoded like real ones but embedded with a fixed random projection of a
+    tiny thumbnail, and texts with a random vector seeded by their hash. Scores keep the
+    CLIP scale (100 * cosine), so thresholds and selections behave as with the real model.
+    """
+    model_id = ModelTypes.STUB.value
+    dim = 64
+
+    def __init__(self):
+        super().__init__()
+        self.projection = None
+        self.load_model()
+
+    def load_model(self):
+        rng = np.random.default_rng(0)
+        self.projection = rng.standard_normal((PIXELS * PIXELS * 3, self.dim)).astype(np.float32)
+        logger.info("Stub model loaded")
+
+    def unload_model(self):
+        self.clean_memory()
+        self.projection = None
+
+    def is_loaded(self):
+        return self.projection is not None
+
+    def warm_up(self):
+        self.run_synthetic_batch(1)
+
+    def _process(self, payload):
+        pixels = decode_image(payload).resize((PIXELS, PIXELS))
+        return np.asarray(pixels, dtype=np.float32).reshape(1, -1) / 255.0
+
+    def _embed(self, pixels):
+        return 100 * _unit((pixels - 0.5) @ self.projection)
+
+    def load_images_from_directory(self, image_dir, workers=LOADER_WORKERS, names=None):
+        source = open_source(image_dir)
+        files = self.skip_quarantined(image_dir, select_files(source.list_files(), names))
+        files = self.take_cached_embeddings(image_dir, files)
+        pool = DecodePool(self._process, workers)
+        for decoded in pool.chunks(source.iter_payloads([f[0] for f in files])):
+            self.image_dict.update(decoded)
+            self.encode_images()
+        self.quarantine_failures(image_dir, files, pool.failures)
+
+    def encode_images(self, batch_size=None):
+        if not self.image_dict:
+            return
+        batch_size = batch_size or self.batch_size
+        names = list(self.image_dict.keys())
+        first_row = len(self.image_names)
+        for i in range(0, len(names), batch_size):
+            batch_names = names[i:i + batch_size]
+            batch = np.concatenate([self.image_dict.pop(name) for name in batch_names])
+            self.add_embeddings(batch_names, self._embed(batch))
+            self.batch_boundary()
+        self.cache_embeddings(names, self.image_embeddings[first_row:])
+
+    def run_synthetic_batch(self, batch_size):
+        self._embed(np.random.rand(batch_size, self.projection.shape[0]).astype(np.float32))
+
+    def encode_image_files(self, image_paths):
+        return self._embed(np.concatenate([self._process(path) for path in image_paths]))
+
+    def encode_texts(self, texts):
+        vectors = []
+        for text in texts:
+            seed = int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+            vectors.append(np.random.default_rng(seed).standard_normal(self.dim))
+        return _unit(np.stack(vectors))
+
+    def search_images(self, prompt, batch_size=None):
+        image_names, scores = self.score_texts([prompt], batch_size)
+        return ScoreResult(prompt, image_names, scores[:, 0])
+
+    def auto_categorize_image(self, multi_label=MULTI_LABEL):
+        """Fixed categories as in the CLIP engine; everything else goes to "other"."""
+        image_names, scores = self.score_texts(FIXED_CATEGORIES)
+        thresholds = np.array([CATEGORY_THRESHOLDS.get(c, THRESHOLD) for c in FIXED_CATEGORIES], dtype=np.float32)
+        passed = scores > thresholds
+        if multi_label:
+            assigned = passed
+        else:
+            assigned = np.zeros_like(passed)
+            assigned[np.arange(len(image_names)), np.argmax(passed, axis=1)] = True
+            assigned &= passed
+
+        results = defaultdict(list)
+        for column, category in enumerate(FIXED_CATEGORIES):
+            results[category] = [image_names[i] for i in np.flatnonzero(assigned[:, column])]
+        results["other"] = [image_names[i] for i in np.flatnonzero(~passed.any(axis=1))]
+        return results
+
+    def clean_memory(self):
+        self.image_dict.clear()
+        self.pending_files.clear()
+        self.image_names = []
+        self.image_embeddings = None
+        self.load_stats = new_load_stats()
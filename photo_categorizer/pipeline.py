@@ -0,0 +1,165 @@
+"""
+Categorization jobs shared by the Flask backend and the command line.
+Both produce the same folder layout below the output root of the target, which is
+the target folder itself, or a directory named after it for archives:
+  auto categorize:  <target_folder>/<category>/<image>
+  prompt search:    <target_folder>/<selected_text>/<output_folder>/<image>
+  similar search:   <target_folder>/<output_folder>/<image>
+  category tree:    <target_folder>/<category>/<sub-category>/.../<image>
+  events:           <target_folder>/events/<date>/<image>
+"""
+
+from photo_categorizer.config import THRESHOLD, FIXED_CATEGORIES, LOADER_WORKERS, MULTI_LABEL, CATEGORY_TREE, \
+    EVENTS_FOLDER
+from photo_categorizer.events import read_capture_infos, group_events
+from photo_categorizer.hierarchy import ParentEmbeddings, categorize_tree
+from photo_categorizer.jobs import JobJournal
+from photo_categorizer.logger import logger
+from photo_categorizer.memory_profile import mark_phase
+from photo_categorizer.model.BaseModelEngine import BaseModelEngine
+from photo_categorizer.results import materialize, result_path
+from photo_categorizer.sources import open_source, source_key, join_location
+
+
+def auto_categorize_folder(model: BaseModelEngine, target_folder, mode="copy", journal: JobJournal = None,
+                           multi_label=MULTI_LABEL, tree=CATEGORY_TREE):
+    """
+    Categorize the images already loaded from target_folder into category folders.
+    With multi_label an image goes to every fixed category it passes, and copies are
+    replaced by hard links so an image in several folders is stored once.
+    Sub-categories of `tree` are then assigned from the same embeddings.
+    With a journal, assignments and finished folders are checkpointed; a resumed job
+    reuses journaled assignments instead of running the model.
+    Returns (categories, results) where results maps category -> image names.
+    """
+    if journal is not None and journal.assignments is not None:
+        logger.info(f"Resuming auto categorizer for {target_folder} from checkpoint")
+        results = journal.assignments
+    else:
+        logger.info(f"Running auto categorizer for {target_folder}")
+        _update(journal, phase="assigning")
+        results = {k: list(v) for k, v in model.auto_categorize_image(multi_label=multi_label).items()}
+        _update(journal, phase="materializing", assignments=results)
+
+    if multi_label and mode == "copy":
+        mode = "link"
+
+    # Fixed categories always get a folder; discovered clusters are named by the model
+    categories = FIXED_CATEGORIES + [k for k in results.keys() if k not in FIXED_CATEGORIES]
+    output_root = open_source(target_folder).output_root
+    for category in categories:
+        if journal is not None and journal.is_materialized(category):
+            continue
+        output_path = join_location(output_root, category)
+        materialize(target_folder, output_path, results.get(category, []), mode=mode, boundary=model.batch_boundary)
+        if journal is not None:
+            journal.mark_materialized(category)
+
+    if tree:
+        if not model.image_names:  # Resumed from journaled assignments; the embedding cache makes this cheap
+            model.load_images_from_directory(target_folder)
+        parent = ParentEmbeddings(target_folder, model.image_names, model.image_embeddings, results)
+        categorize_tree(model, parent, tree, mode=mode)
+
+    _update(journal, phase="completed")
+    return categories, results
+
+
+def events_folder(model: BaseModelEngine, target_folder, mode="copy", workers=LOADER_WORKERS,
+                  journal: JobJournal = None):
+    """
+    Group the images already loaded from target_folder into events by capture time,
+    place and visual similarity of neighbouring segments, one folder per event.
+    Returns (events, results) where results maps event -> image names.
+    """
+    logger.info(f"Grouping {len(model.image_names)} images of {target_folder} into events")
+    _update(journal, phase="reading_exif")
+    names = list(model.image_names)
+    times, positions, exif_count = read_capture_infos(target_folder, names, workers=workers)
+    _update(journal, phase="grouping")
+    results = group_events(names, model.image_embeddings, times, positions)
+    logger.info(f"Found {len(results)} events, {exif_count} of {len(names)} images with an EXIF capture time")
+
+    _update(journal, phase="materializing", assignments=results)
+    output_root = join_location(open_source(target_folder).output_root, EVENTS_FOLDER)
+    for event, event_images in results.items():
+        materialize(target_folder, join_location(output_root, event), event_images, mode=mode,
+                    boundary=model.batch_boundary)
+    _update(journal, phase="completed")
+    return list(results.keys()), results
+
+
+def search_folder(model: BaseModelEngine, target_folder, selected_text, output_folder, prompt,
+                  threshold=THRESHOLD, mode="copy", workers=LOADER_WORKERS, journal: JobJournal = None,
+                  parent: ParentEmbeddings = None):
+    """
+    Load <target_folder>/<selected_text>, copy images matching the prompt into the
+    output folder and persist the full score vector for later cutoff changes.
+    With the parent embeddings of target_folder, the category folder's rows are taken
+    from them instead of encoding its images again.
+    Returns (source_dir, output_path, ScoreResult).
+    """
+    source_dir = join_location(open_source(target_folder).output_root, selected_text)
+    output_path = join_location(source_dir, output_folder)
+
+    _update(journal, phase="encoding")
+    names, rows = None, None
+    if parent is not None and parent.root == source_key(target_folder):
+        names, rows = parent.rows_for_folder(source_dir)
+    if rows is not None:
+        model.add_embeddings(names, parent.embeddings[rows])
+        logger.info(f"Reusing {len(rows)} parent embeddings for '{source_dir}'")
+    else:
+        model.load_images_from_directory(source_dir, workers=workers)
+        logger.info(f"Loading images from '{source_dir}'")
+    # Search images based on prompt
+    logger.info(f"Running search for prompt '{prompt}' into '{output_path}'")
+    results = model.search_images(
+        prompt=prompt
+    )
+
+    # Copy matching images, keeping the full score vector for later cutoff changes
+    selected = results.select("threshold", threshold)
+    _update(journal, phase="materializing")
+    materialize(source_dir, output_path, selected, mode=mode)
+    if mode != "dry-run":
+        results.selected = selected
+        results.save(result_path(output_path))
+    _update(journal, phase="completed")
+    logger.info(f"Copied {len(selected)} of {len(results)} images above {threshold}")
+
+    return source_dir, output_path, results
+
+
+def similar_folder(model: BaseModelEngine, target_folder, output_folder, example_paths, text=None,
+                   image_weight=1.0, text_weight=1.0, top_k=50, mode="copy", workers=LOADER_WORKERS,
+                   journal: JobJournal = None):
+    """
+    Load target_folder, copy the top_k images most similar to the examples (and text)
+    into the output folder and persist the full score vector.
+    Returns (source_dir, output_path, ScoreResult).
+    """
+    output_path = join_location(open_source(target_folder).output_root, output_folder)
+
+    _update(journal, phase="encoding")
+    model.load_images_from_directory(target_folder, workers=workers)
+    logger.info(f"Running similarity search for {len(example_paths)} examples into '{output_path}'")
+    results = model.search_similar(example_paths, text, image_weight, text_weight)
+
+    selected = results.select("top_k", top_k)
+    _update(journal, phase="materializing")
+    materialize(target_folder, output_path, selected, mode=mode)
+    if mode != "dry-run":
+        results.selected = selected
+        results.save(result_path(output_path))
+    _update(journal, phase="completed")
+    logger.info(f"Copied top {len(selected)} of {len(results)} images similar to {results.prompt}")
+
+    return target_folder, output_path, results
+
+
+def _update(journal, **fields):
+    if "phase" in fields:
+        mark_phase(fields["phase"])
+    if journal is not None:
+        journal.update(**fields)
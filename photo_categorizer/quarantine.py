@@ -0,0 +1,81 @@
+"""
+Quarantine reports of images that could not be loaded.
+
+A file that is corrupt, truncated, too large (MAX_IMAGE_PIXELS) or too slow to decode
+(DECODE_TIMEOUT) is skipped by the loader and recorded in the report of its source,
+QUARANTINE_DIR/<digest>.json, with its size, mtime and the reason. Later loads skip
+reported files without touching them again until they change.
+
+Timeouts and I/O errors (a busy disk, an object-store hiccup) may not happen again,
+so those files are only skipped until `retry_after`, QUARANTINE_RETRY_SECONDS times
+the number of tries later; after QUARANTINE_RETRIES failed loads in a row they are
+quarantined for good like the rest.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from photo_categorizer.config import QUARANTINE_DIR, QUARANTINE_RETRY_SECONDS, QUARANTINE_RETRIES
+from photo_categorizer.logger import logger
+from photo_categorizer.sources import source_key
+
+
+def report_path(image_dir, quarantine_dir=QUARANTINE_DIR):
+    return os.path.join(quarantine_dir, hashlib.sha1(source_key(image_dir).encode("utf-8")).hexdigest() + ".json")
+
+
+def load_report(image_dir, quarantine_dir=QUARANTINE_DIR):
+    """Return {name: {"size", "mtime_ns", "reason"[, "tries", "retry_after"]}} of the quarantined files of a source."""
+    try:
+        with open(report_path(image_dir, quarantine_dir), encoding="utf-8") as f:
+            return json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def split_quarantined(image_dir, files, quarantine_dir=QUARANTINE_DIR):
+    """Split [(name, size, mtime_ns)] into (files to load, files quarantined and unchanged since)."""
+    report = load_report(image_dir, quarantine_dir)
+    if not report:
+        return files, []
+    now = time.time()
+    keep, skipped = [], []
+    for name, size, mtime in files:
+        entry = report.get(name)
+        if entry is not None and entry["size"] == size and entry["mtime_ns"] == mtime and \
+                entry.get("retry_after", now) >= now:
+            skipped.append((name, size, mtime))
+        else:
+            keep.append((name, size, mtime))
+    return keep, skipped
+
+
+def update_report(image_dir, attempted, failures, quarantine_dir=QUARANTINE_DIR):
+    """
+    Record the files of `failures` [(name, size, mtime_ns, reason, transient)] and forget
+    reported files among `attempted` names that loaded fine this time.
+    """
+    report = load_report(image_dir, quarantine_dir)
+    if not report and not failures:
+        return
+    previous = {name: report.pop(name) for name in attempted if name in report}
+    now = time.time()
+    for name, size, mtime, reason, transient in failures:
+        entry = {"size": size, "mtime_ns": mtime, "reason": reason}
+        if transient:
+            before = previous.get(name)
+            unchanged = before is not None and before["size"] == size and before["mtime_ns"] == mtime
+            entry["tries"] = before.get("tries", 0) + 1 if unchanged else 1
+            if entry["tries"] < QUARANTINE_RETRIES:
+                entry["retry_after"] = now + QUARANTINE_RETRY_SECONDS * entry["tries"]
+        report[name] = entry
+
+    path = report_path(image_dir, quarantine_dir)
+    os.makedirs(quarantine_dir, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"source": source_key(image_dir), "files": report}, f, indent=1)
+    os.replace(path + ".tmp", path)
+    if failures:
+        logger.warning(f"Quarantined {len(failures)} images of {image_dir}, see {path}")
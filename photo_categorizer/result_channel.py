@@ -0,0 +1,155 @@
+"""
+Shared-memory result channel between the backend and the GUI.
+
+Large score results are not serialized through HTTP: the backend writes them once as
+NPY arrays into RESULT_CHANNEL_DIR (tmpfs /dev/shm where available, so they never
+touch the disk) and answers the HTTP request with a small handle. The GUI memory maps
+the arrays and reads them directly, so previews and threshold sliders cost no
+transfer at all. Each publish writes a new versioned directory and then renames it
+into place, so readers never see a half written result. Results older than
+RESULT_CHANNEL_MAX_AGE, and the oldest ones beyond RESULT_CHANNEL_MAX_MB in total,
+are removed on every publish; a backend removes its own results when it exits.
+
+    <digest>-<version>/names.npy     utf-8 image names (fixed width bytes)
+                       scores.npy    float32 scores
+                       order.npy     int32 rows sorted by descending score
+                       selected.npy  bool, rows currently materialized
+"""
+
+import hashlib
+import os
+import shutil
+import time
+
+import numpy as np
+
+from photo_categorizer.config import RESULT_CHANNEL_DIR, RESULT_CHANNEL_MAX_MB, RESULT_CHANNEL_MAX_AGE
+from photo_categorizer.logger import logger
+from photo_categorizer.results import ScoreResult
+
+ARRAYS = ["names", "scores", "order", "selected"]
+
+
+def _private_dir(channel_dir):
+    """Create the channel directory readable by this user only, refusing one someone else owns."""
+    os.makedirs(channel_dir, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):
+        stat = os.stat(channel_dir)
+        if stat.st_uid != os.getuid():
+            raise PermissionError(f"Result channel {channel_dir} belongs to another user")
+        if stat.st_mode & 0o077:
+            os.chmod(channel_dir, 0o700)
+
+
+def publish(key, result: ScoreResult, source_dir, channel_dir=RESULT_CHANNEL_DIR):
+    """Write a score result to the channel and return its handle; older versions of key are removed."""
+    _private_dir(channel_dir)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    version = time.time_ns()
+    path = os.path.join(channel_dir, f"{digest}-{version}")
+    tmp_path = path + ".tmp"
+    os.makedirs(tmp_path)
+
+    selected = set(result.selected)
+    arrays = {
+        "names": np.array([name.encode("utf-8") for name in result.image_names], dtype=bytes),
+        "scores": result.scores,
+        "order": np.argsort(-result.scores, kind="stable").astype(np.int32),
+        "selected": np.fromiter((name in selected for name in result.image_names), dtype=bool, count=len(result)),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + ".npy"), array)
+    os.replace(tmp_path, path)
+    _prune(channel_dir, digest, keep=path)
+    _enforce_limits(channel_dir, keep=path)
+
+    return {"path": path, "version": version, "rows": len(result), "prompt": result.prompt,
+            "selected": len(selected), "source_dir": source_dir}
+
+
+def _prune(channel_dir, digest, keep):
+    for name in os.listdir(channel_dir):
+        path = os.path.join(channel_dir, name)
+        if name.startswith(digest + "-") and path != keep:
+            # Readers still holding a mapping keep their data on POSIX; Windows refuses, retried next publish
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _enforce_limits(channel_dir, keep, max_mb=RESULT_CHANNEL_MAX_MB, max_age=RESULT_CHANNEL_MAX_AGE):
+    """Remove results (of any key, and abandoned .tmp directories) that are too old or over the size cap."""
+    entries = []
+    for name in os.listdir(channel_dir):
+        path = os.path.join(channel_dir, name)
+        if path == keep:
+            continue
+        try:
+            files = [entry for entry in os.scandir(path) if entry.is_file()]
+            size = sum(entry.stat().st_size for entry in files)
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            continue  # Removed by another publisher meanwhile
+        entries.append((mtime, size, path))
+
+    total_mb = sum(size for _, size, _ in entries) / 2 ** 20
+    now = time.time()
+    for mtime, size, path in sorted(entries):
+        if now - mtime <= max_age and total_mb <= max_mb:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_mb -= size / 2 ** 20
+
+
+def unpublish(handles):
+    """Remove published results, e.g. those of a backend that shuts down."""
+    for handle in handles:
+        shutil.rmtree(handle["path"], ignore_errors=True)
+
+
+class SharedResult:
+    """Read-only, memory-mapped view of a published score result."""
+
+    def __init__(self, handle):
+        self.handle = handle
+        arrays = {name: np.load(os.path.join(handle["path"], name + ".npy"), mmap_mode="r") for name in ARRAYS}
+        self.names = arrays["names"]
+        self.scores = arrays["scores"]
+        self.order = arrays["order"]
+        self.selected = arrays["selected"]
+        self._sorted_scores = None
+
+    def __len__(self):
+        return len(self.scores)
+
+    @property
+    def sorted_scores(self):
+        """Scores in descending order, computed once for cutoff queries."""
+        if self._sorted_scores is None:
+            self._sorted_scores = np.asarray(self.scores)[self.order]
+        return self._sorted_scores
+
+    def name(self, row):
+        return self.names[row].decode("utf-8")
+
+    def count_above(self, threshold):
+        """Number of images scoring above threshold (same rule as ScoreResult.select)."""
+        return int(np.searchsorted(-self.sorted_scores, -float(threshold), side="left"))
+
+    def names_above(self, threshold, limit=None):
+        """Names of images scoring above threshold, best first."""
+        count = self.count_above(threshold)
+        if limit is not None:
+            count = min(count, limit)
+        return [self.name(row) for row in self.order[:count]]
+
+    def close(self):
+        self.names = self.scores = self.order = self.selected = None
+        self._sorted_scores = None
+
+
+def open_handle(handle):
+    """Open a handle, or return None if its result was replaced or removed in the meantime."""
+    try:
+        return SharedResult(handle)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Shared result {handle.get('path')} is not available: {e}")
+        return None
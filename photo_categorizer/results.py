@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from photo_categorizer.config import CACHE_DIR, OUTPUT_MARKER, MATERIALIZE_YIELD_FILES
+from photo_categorizer.logger import logger
+from photo_categorizer.sources import open_source, source_key, safe_join, DirectorySource, ObjectStoreSource
+
+SELECTION_METHODS = ["threshold", "top_k", "percentile", "otsu", "gap"]
+OUTPUT_MODES = ["copy", "link", "dry-run"]
+
+
+class ScoreResult:
+    """
+    Full score vector of one prompt search.
+    Holds every image score, so any cutoff can be applied later without running the model again.
+    """
+
+    def __init__(self, prompt, image_names, scores, selected=None):
+        self.prompt = prompt
+        self.image_names = list(image_names)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        # Names currently materialized in the output folder
+        self.selected = list(selected) if selected is not None else []
+
+    def __iter__(self):
+        """Iterate over (image_name, score) pairs."""
+        return iter(zip(self.image_names, self.scores.tolist()))
+
+    def __len__(self):
+        return len(self.image_names)
+
+    # ----------------- Selection -----------------
+    def select(self, method, value=None):
+        """Return the names picked by a selection method, best score first."""
+        if method not in SELECTION_METHODS:
+            raise ValueError(f"Unsupported selection method: {method}")
+        if len(self) == 0:
+            return []
+
+        if method == "threshold":
+            mask = self.scores > float(value)
+        elif method == "top_k":
+            return self._top_k(int(value))
+        elif method == "percentile":
+            mask = self.scores >= np.percentile(self.scores, float(value))
+        elif method == "otsu":
+            mask = self.scores > self.otsu_threshold()
+        else:
+            mask = self.scores > self.gap_threshold(value if value is not None else 0.5)
+
+        indices = np.flatnonzero(mask)
+        indices = indices[np.argsort(-self.scores[indices], kind="stable")]
+        return [self.image_names[i] for i in indices]
+
+    def _top_k(self, k):
+        k = max(0, min(k, len(self)))
+        if k == 0:
+            return []
+        # argpartition is O(n); only the k winners get sorted
+        indices = np.argpartition(-self.scores, k - 1)[:k]
+        indices = indices[np.argsort(-self.scores[indices], kind="stable")]
+        return [self.image_names[i] for i in indices]
+
+    def otsu_threshold(self, bins=256):
+        """Threshold maximizing the between-class variance of the score histogram."""
+        if len(self) < 2 or self.scores.min() == self.scores.max():
+            return float(self.scores.max()) if len(self) else 0.0
+        counts, edges = np.histogram(self.scores, bins=bins)
+        centers = (edges[:-1] + edges[1:]) / 2
+        weight_low = np.cumsum(counts)
+        weight_high = weight_low[-1] - weight_low
+        sum_low = np.cumsum(counts * centers)
+        mean_low = sum_low / np.maximum(weight_low, 1)
+        mean_high = (sum_low[-1] - sum_low) / np.maximum(weight_high, 1)
+        between = weight_low * weight_high * (mean_low - mean_high) ** 2
+        return float(edges[np.argmax(between) + 1])
+
+    def gap_threshold(self, max_fraction=0.5):
+        """
+        Threshold at the largest drop between consecutive sorted scores.
+        Only the top `max_fraction` of images is searched, so the noisy tail is ignored.
+        """
+        if len(self) < 2:
+            return float(self.scores.min()) - 1 if len(self) else 0.0
+        ordered = np.sort(self.scores)[::-1]
+        limit = max(2, int(np.ceil(len(ordered) * float(max_fraction))))
+        head = ordered[:limit]
+        drop = int(np.argmax(head[:-1] - head[1:]))
+        return float(head[drop + 1])
+
+    def summary(self, bins=20):
+        """Score distribution and suggested cutoffs for building a threshold UI."""
+        if len(self) == 0:
+            return {"prompt": self.prompt, "count": 0, "selected": 0}
+        counts, edges = np.histogram(self.scores, bins=bins)
+        return {
+            "prompt": self.prompt,
+            "count": len(self),
+            "selected": len(self.selected),
+            "min": float(self.scores.min()),
+            "max": float(self.scores.max()),
+            "mean": float(self.scores.mean()),
+            "percentiles": {str(p): float(v) for p, v in
+                            zip((50, 75, 90, 95, 99), np.percentile(self.scores, [50, 75, 90, 95, 99]))},
+            "histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+            "suggested": {"otsu": self.otsu_threshold(), "gap": self.gap_threshold()},
+        }
+
+    # ----------------- Persistence -----------------
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, prompt=np.array(self.prompt), image_names=np.array(self.image_names, dtype=str),
+                 scores=self.scores, selected=np.array(self.selected, dtype=str))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(str(data["prompt"]), data["image_names"].tolist(), data["scores"],
+                       data["selected"].tolist())
+
+
+def result_path(output_path):
+    """Location of the persisted scores for one output folder."""
+    digest = hashlib.sha1(source_key(output_path).encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, "results", digest + ".npz")
+
+
+def locations_path():
+    return os.path.join(CACHE_DIR, "results", "locations.json")
+
+
+def load_locations():
+    """Return {folder name: (source_dir, output_path)} of the results persisted so far."""
+    try:
+        with open(locations_path(), encoding="utf-8") as f:
+            return {name: tuple(location) for name, location in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_location(folder_name, source_dir, output_path):
+    """Remember where the results of a processed folder live, so they outlive the backend process."""
+    locations = load_locations()
+    locations[folder_name] = (source_dir, output_path)
+    path = locations_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(locations, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def is_in_place(src, dst):
+    """True if dst already holds a complete copy or link of src."""
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    src_stat = os.stat(src)
+    return os.path.samestat(src_stat, dst_stat) or dst_stat.st_size == src_stat.st_size
+
+
+def place_file(src, dst, mode="copy"):
+    """Put src at dst by copying or hard linking; links fall back to a copy across devices."""
+    if mode == "link":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copy(src, dst)
+
+
+def write_file(dst, data):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp_path = dst + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, dst)
+
+
+def mark_output(output_path):
+    """Mark a local folder as categorization output, so it is never indexed as part of the library."""
+    marker = os.path.join(output_path, OUTPUT_MARKER)
+    if not os.path.exists(marker):
+        open(marker, "a").close()
+
+
+def is_output_folder(path):
+    return os.path.exists(os.path.join(path, OUTPUT_MARKER))
+
+
+def materialize(source_dir, output_path, names, previous=(), mode="copy", boundary=None):
+    """
+    Make output_path hold exactly `names` from source_dir (a directory, archive or objstore:// URI).
+    Only the difference to the previous selection is copied or removed, so changing
+    a cutoff touches just the files that move in or out of the folder.
+    `boundary` is called every MATERIALIZE_YIELD_FILES files placed, e.g. model.batch_boundary
+    so a bulk job lets waiting interactive jobs run in the middle of a large copy.
+    Returns (added, removed) counts.
+    """
+    source = open_source(source_dir)
+    if isinstance(source, ObjectStoreSource):
+        return source.materialize(output_path, names, previous, mode, boundary)
+    if mode == "dry-run":
+        return len(set(names) - set(previous)), len(set(previous) - set(names))
+    os.makedirs(output_path, exist_ok=True)
+    mark_output(output_path)
+    wanted = set(names)
+    previous = set(previous)
+
+    removed = 0
+    for name in previous - wanted:
+        try:
+            os.remove(safe_join(output_path, name))
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    added = 0
+    if isinstance(source, DirectorySource):
+        for name in names:
+            src = os.path.join(source.location, name)
+            dst = safe_join(output_path, name)
+            # Idempotent: a file already in place (e.g. before a crash) is not written again
+            if name in previous and os.path.exists(dst) or is_in_place(src, dst):
+                continue
+            place_file(src, dst, mode)
+            added += 1
+            _yield(boundary, added)
+    else:
+        # Archive members cannot be linked; the missing ones are written in one sequential pass
+        sizes = {name: size for name, size, _ in source.list_files()}
+        missing = []
+        for name in names:
+            dst = safe_join(output_path, name)
+            if name in previous and os.path.exists(dst) or \
+                    os.path.exists(dst) and os.path.getsize(dst) == sizes.get(name):
+                continue
+            missing.append(name)
+        for name, data in source.iter_payloads(missing):
+            if isinstance(data, Exception):
+                logger.warning(f"Could not copy {name}: {data}")
+                continue
+            write_file(safe_join(output_path, name), data)
+            added += 1
+            _yield(boundary, added)
+
+    logger.info(f"Materialized {output_path}: {added} added, {removed} removed")
+    return added, removed
+
+
+def _yield(boundary, placed):
+    if boundary is not None and placed % MATERIALIZE_YIELD_FILES == 0:
+        boundary()
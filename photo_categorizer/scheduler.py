@@ -0,0 +1,125 @@
+"""
+Priority scheduling of backend jobs on the shared model engine.
+
+Jobs run one at a time in two priority classes. Interactive jobs (prompt searches,
+similarity searches, previews) go before bulk jobs (auto categorization, index
+export, shards encoded for a coordinator). A running bulk job is preempted at the
+next encoder batch boundary, or between files it copies into output folders, once
+an interactive job is waiting: its loaded images
+and embeddings are set aside, the interactive jobs run on an empty engine, and the
+bulk job then continues where it stopped.
+
+Job latency (submission to completion) and queue wait are kept per class so the
+latency SLOs in SLO_SECONDS can be checked, including interactive latency while
+bulk work was active.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from photo_categorizer.config import SLO_SECONDS, SLO_WINDOW
+from photo_categorizer.logger import logger
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = [INTERACTIVE, BULK]
+
+
+class JobScheduler:
+    def __init__(self, slo_seconds=SLO_SECONDS, window=SLO_WINDOW):
+        self.slo_seconds = slo_seconds
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._owner = None  # Class of the job holding the engine
+        self._waiting = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._paused = 0  # Preempted bulk jobs, resumed before new bulk jobs start
+        self._bulk_jobs = 0  # Bulk jobs submitted and not finished, running or not
+        self.preemptions = 0
+        self.samples = {cls: deque(maxlen=window) for cls in PRIORITY_CLASSES}
+
+    @contextmanager
+    def job(self, priority):
+        """Run the body as one job of the given class, once the engine is free for it."""
+        if getattr(self._local, "priority", None) is not None:
+            yield  # Nested job of the same thread, e.g. a resumed job
+            return
+        submitted = time.perf_counter()
+        with self._cond:
+            contended = self._bulk_jobs > 0
+            if priority == BULK:
+                self._bulk_jobs += 1
+            self._wait_turn(priority)
+        started = time.perf_counter()
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = None
+            finished = time.perf_counter()
+            with self._cond:
+                self._owner = None
+                if priority == BULK:
+                    self._bulk_jobs -= 1
+                self.samples[priority].append((finished - submitted, started - submitted, contended))
+                self._cond.notify_all()
+
+    def _wait_turn(self, priority, resuming=False):
+        """Block until the engine is free for this job; called with the condition held."""
+        self._waiting[priority] += 1
+        while self._owner is not None or (priority == BULK and (
+                self._waiting[INTERACTIVE] or (self._paused and not resuming))):
+            self._cond.wait()
+        self._waiting[priority] -= 1
+        self._owner = priority
+
+    def yield_point(self, engine):
+        """
+        Called by the engine between encoder batches. A bulk job pauses here while
+        interactive jobs are waiting; its engine state is restored before it continues.
+        """
+        if getattr(self._local, "priority", None) != BULK or not self._waiting[INTERACTIVE]:
+            return
+        state = engine.stash_state()
+        with self._cond:
+            self.preemptions += 1
+            self._paused += 1
+            self._owner = None
+            self._cond.notify_all()
+            logger.info(f"Bulk job paused for {self._waiting[INTERACTIVE]} interactive jobs")
+            self._wait_turn(BULK, resuming=True)
+            self._paused -= 1
+        engine.restore_state(state)
+        logger.info("Bulk job resumed")
+
+    def status(self):
+        with self._cond:
+            status = {"running": self._owner, "waiting": dict(self._waiting), "paused": self._paused,
+                      "preemptions": self.preemptions, "classes": {}}
+            samples = {cls: list(values) for cls, values in self.samples.items()}
+        for cls, values in samples.items():
+            status["classes"][cls] = self._latency_stats(cls, values)
+        return status
+
+    def _latency_stats(self, cls, values):
+        slo = self.slo_seconds.get(cls)
+        stats = {"jobs": len(values), "slo_seconds": slo}
+        if not values:
+            return stats
+        latencies = np.array([v[0] for v in values])
+        waits = np.array([v[1] for v in values])
+        stats.update({
+            "p50_seconds": float(np.percentile(latencies, 50)),
+            "p95_seconds": float(np.percentile(latencies, 95)),
+            "max_seconds": float(latencies.max()),
+            "wait_p95_seconds": float(np.percentile(waits, 95)),
+        })
+        if slo is not None:
+            stats["within_slo"] = float(np.mean(latencies <= slo))
+        contended = [v[0] for v in values if v[2]]
+        if contended:
+            stats["p95_seconds_during_bulk"] = float(np.percentile(contended, 95))
+        return stats
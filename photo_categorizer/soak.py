@@ -0,0 +1,131 @@
+"""
+Memory soak test.
+
+Runs many categorization jobs in a row (auto categorize, prompt search, similarity
+search) against the model-free stub engine on a generated library, the way the
+backend runs them, and fails if RSS grows past a tolerance once warmed up:
+
+    python -m photo_categorizer.soak --jobs 300 --images 500 --tolerance-mb 30
+
+With --archive the library is a ZIP whose images sit in sub-directories, so the
+searches run on category folders materialized from nested archive members.
+"""
+
+import argparse
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+from photo_categorizer.memory_profile import MemoryProfiler
+from photo_categorizer.model.stub_engine import StubEngine
+from photo_categorizer.pipeline import auto_categorize_folder, search_folder, similar_folder
+from photo_categorizer.sources import open_source
+
+
+def make_library(folder, count, size=64, seed=0):
+    """Write `count` random JPEG images into folder."""
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(os.path.join(folder, f"img_{i:06d}.jpg"), quality=80)
+
+
+def pack_library(folder, dirs=3):
+    """Move the images of folder into folder.zip, spread over `dirs` sub-directories; returns the archive path."""
+    archive_path = folder + ".zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        for i, name in enumerate(sorted(os.listdir(folder))):
+            archive.write(os.path.join(folder, name), f"shoot_{i % dirs}/{name}")
+    shutil.rmtree(folder)
+    return archive_path
+
+
+def run_job(engine, kind, library, number):
+    output_root = open_source(library).output_root
+    if kind == "auto":
+        engine.load_images_from_directory(library)
+        auto_categorize_folder(engine, library, mode="link")
+    elif kind == "search":
+        category = max((name for name in os.listdir(output_root) if os.path.isdir(os.path.join(output_root, name))),
+                       key=lambda name: len(os.listdir(os.path.join(output_root, name))))
+        _, _, result = search_folder(engine, library, category, "soak_search", f"a photo of thing {number % 7}",
+                                     mode="link")
+        if not len(result):
+            raise RuntimeError(f"Search of category {category} found no images")
+    else:
+        # Examples are image files; pick one from the first non-empty category folder
+        folders = [os.path.join(output_root, name) for name in sorted(os.listdir(output_root))]
+        folder = next(path for path in folders if os.path.isdir(path) and open_source(path).list_files())
+        example = os.path.join(folder, min(name for name, _, _ in open_source(folder).list_files()))
+        similar_folder(engine, library, "soak_similar", [example], f"a photo of thing {number % 5}", mode="link")
+
+
+def run_soak(jobs, images, warmup, tolerance_mb, trace=False, workdir=None, archive=False):
+    """Returns (passed, growth_mb, profiler)."""
+    root = tempfile.mkdtemp(prefix="photo_soak_", dir=workdir)
+    try:
+        library = os.path.join(root, "library")
+        make_library(library, images)
+        if archive:
+            library = pack_library(library)
+        engine = StubEngine()  # No embedding cache, so every job decodes its images
+        profiler = MemoryProfiler(max_jobs=jobs, trace=trace)
+
+        baseline_mb = None
+        # The first auto job creates the category folders the searches read from
+        kinds = itertools.cycle(["auto", "search", "similar"])
+        for number in range(jobs):
+            kind = next(kinds)
+            profile = profiler.start_job(kind, number)
+            try:
+                run_job(engine, kind, library, number)
+            finally:
+                engine.clean_memory()
+                report = profiler.finish_job(profile)
+
+            rss_mb = report["phases"][-1]["rss_mb"]
+            if number + 1 == warmup:
+                baseline_mb = rss_mb
+            if (number + 1) % 50 == 0:
+                print(f"{number + 1} jobs, RSS {rss_mb:.0f} MB")
+
+        final_mb = profiler.jobs[-1]["phases"][-1]["rss_mb"]
+        growth_mb = final_mb - (baseline_mb if baseline_mb is not None else profiler.baseline_rss_mb)
+        return growth_mb <= tolerance_mb, growth_mb, profiler
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="photo_categorizer.soak", description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=300)
+    parser.add_argument("--images", type=int, default=500, help="images in the generated library")
+    parser.add_argument("--warmup", type=int, default=30, help="jobs run before the RSS baseline is taken")
+    parser.add_argument("--tolerance-mb", type=float, default=30.0, help="allowed RSS growth after warm-up")
+    parser.add_argument("--trace", action="store_true", help="report the allocation sites that grew (tracemalloc)")
+    parser.add_argument("--workdir", default=None, help="where to generate the library")
+    parser.add_argument("--archive", action="store_true", help="generate the library as a ZIP with nested members")
+    args = parser.parse_args(argv)
+
+    passed, growth_mb, profiler = run_soak(args.jobs, args.images, min(args.warmup, args.jobs), args.tolerance_mb,
+                                           args.trace, args.workdir, args.archive)
+    print(f"RSS growth after warm-up: {growth_mb:+.1f} MB (tolerance {args.tolerance_mb:.0f} MB)")
+    if args.trace and profiler.jobs:
+        for allocation in profiler.jobs[-1]["top_allocations"]:
+            print(f"  {allocation['size_kb']:+.1f} KB in {allocation['count']:+d} blocks at {allocation['where']}")
+    if not passed:
+        print("FAILED: memory grew past tolerance", file=sys.stderr)
+        return 1
+    print("PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+"""
+Image sources.
+
+A target folder can be a local directory, a ZIP or TAR archive, or an
+`objstore://bucket/prefix` URI served by a local object-store stand-in. Every
+source lists its images as [(name, size, mtime_ns), ...] and hands out their
+payloads in one pass in its natural order: file paths for directories (decoded
+by the loader threads in parallel), raw bytes for archives and objects (read
+sequentially, so archives are never extracted to disk). A member that cannot be
+read is handed out as the exception instead of its bytes, so one bad member only
+fails its own image.
+
+Category folders of archive sources are written to a directory next to the
+archive, named after it; object-store sources write their outputs back to the store.
+Archive members in sub-directories are named flat (`trip/IMG_1.jpg` becomes
+`trip__IMG_1.jpg`), so category folders stay flat like those of a directory source.
+"""
+
+import hashlib
+import io
+import ntpath
+import os
+import posixpath
+import shutil
+import tarfile
+import time
+import zipfile
+import zlib
+from abc import ABC, abstractmethod
+
+from PIL import Image
+
+from photo_categorizer.config import IMAGE_EXTENSIONS, OBJECT_STORE_ROOT, MAX_IMAGE_PIXELS, MATERIALIZE_YIELD_FILES
+from photo_categorizer.logger import logger
+
+OBJECT_STORE_SCHEME = "objstore://"
+ZIP_EXTENSIONS = [".zip"]
+TAR_EXTENSIONS = [".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz"]
+
+
+def is_image_file(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _archive_extension(path, extensions):
+    lower = path.lower()
+    return next((ext for ext in sorted(extensions, key=len, reverse=True) if lower.endswith(ext)), None)
+
+
+def member_name(name):
+    """
+    Normalised relative name of an archive member or object, or None if writing it
+    under an output folder could escape that folder (absolute, a drive or a `..` part).
+    """
+    name = posixpath.normpath(name.replace("\\", "/"))
+    if name.startswith("/") or ntpath.splitdrive(name)[0] or name == "." or ".." in name.split("/"):
+        return None
+    return name
+
+
+def safe_join(root, name):
+    """os.path.join(root, name), refusing a name that resolves outside root."""
+    if member_name(name) is None:
+        raise ValueError(f"Refusing to write {name!r} outside {root}")
+    base = os.path.realpath(root)
+    path = os.path.join(base, member_name(name))
+    if os.path.commonpath([base, os.path.realpath(os.path.dirname(path))]) != base:
+        raise ValueError(f"Refusing to write {name!r} outside {root}")
+    return path
+
+
+def _flat_members(location, members):
+    """
+    Yield (flat name, member) for (raw name, member) pairs in archive order, dropping
+    unsafe names. Directory parts are joined with "__"; a name taken already gets a
+    "~2", "~3", ... suffix, so the same archive always yields the same names.
+    """
+    seen = set()
+    for raw, member in members:
+        name = member_name(raw)
+        if name is None:
+            logger.warning(f"Ignoring archive member {raw!r} of {location}: it would be written outside the folder")
+            continue
+        flat = name.replace("/", "__")
+        if flat in seen:
+            stem, ext = os.path.splitext(flat)
+            number = 2
+            while f"{stem}~{number}{ext}" in seen:
+                number += 1
+            flat = f"{stem}~{number}{ext}"
+        seen.add(flat)
+        yield flat, member
+
+
+def source_key(path):
+    """Stable identity of a source location, for caches and comparisons."""
+    return path if path.startswith(OBJECT_STORE_SCHEME) else os.path.abspath(path)
+
+
+def join_location(location, *parts):
+    """os.path.join for directories and archives; object keys always use "/"."""
+    if location.startswith(OBJECT_STORE_SCHEME):
+        return posixpath.join(location, *parts)
+    return os.path.join(location, *parts)
+
+
+def location_exists(location):
+    """Whether an output folder is still there; in an object store, whether anything is stored under it."""
+    if location.startswith(OBJECT_STORE_SCHEME):
+        return bool(ObjectStoreSource(location).list_files())
+    return os.path.isdir(location)
+
+
+def select_files(files, names=None):
+    """Keep the (name, size, mtime_ns) entries of `names`, in listing order; all of them if names is None."""
+    if names is None:
+        return files
+    wanted = set(names)
+    return [f for f in files if f[0] in wanted]
+
+
+def decode_image(payload, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Decode an image from a file path or raw bytes into an RGB PIL image. Images larger
+    than max_pixels are rejected from their header, before any pixel is decoded.
+    """
+    if isinstance(payload, Exception):
+        raise payload
+    with Image.open(io.BytesIO(payload) if isinstance(payload, bytes) else payload) as image:
+        if max_pixels and image.width * image.height > max_pixels:
+            raise ValueError(f"{image.width}x{image.height} image exceeds {max_pixels} pixels")
+        return image.convert("RGB")
+
+
+def read_image_header(stream):
+    """
+    Read the header of an image from a file object. For a JPEG that is every segment
+    up to and including the start of scan, so PIL can open it and read its EXIF, but
+    no pixel data is read; other formats are read whole.
+    """
+    head = stream.read(2)
+    if head != b"\xff\xd8":
+        return head + stream.read()
+    segments = [head]
+    while True:
+        marker = stream.read(2)
+        length = stream.read(2) if len(marker) == 2 and marker[0] == 0xFF and marker[1] != 0xD9 else b""
+        if len(length) < 2:
+            break
+        segments.append(marker + length + stream.read(int.from_bytes(length, "big") - 2))
+        if marker[1] == 0xDA:  # Start of scan; the entropy-coded image data follows
+            break
+    return b"".join(segments)
+
+
+class ImageSource(ABC):
+    def __init__(self, location):
+        self.location = location
+
+    @abstractmethod
+    def list_files(self):
+        """Return [(name, size, mtime_ns), ...] for the images of the source."""
+        pass
+
+    @abstractmethod
+    def iter_payloads(self, names):
+        """Yield (name, payload) for `names` in one pass, in the source's natural order."""
+        pass
+
+    def iter_headers(self, names):
+        """Like iter_payloads, but a payload only has to hold the image header (size, mode, EXIF)."""
+        return self.iter_payloads(names)
+
+    @property
+    def output_root(self):
+        """Where category folders for this source are created."""
+        return self.location
+
+    def read(self, name):
+        payload = next(payload for _, payload in self.iter_payloads([name]))
+        if isinstance(payload, Exception):
+            raise payload
+        return payload
+
+
+class DirectorySource(ImageSource):
+    """Loose image files in a local directory; payloads are paths."""
+
+    def list_files(self):
+        files = []
+        with os.scandir(self.location) as entries:
+            for entry in entries:
+                if is_image_file(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        return files
+
+    def iter_payloads(self, names):
+        for name in names:
+            yield name, os.path.join(self.location, name)
+
+
+class ArchiveSource(ImageSource):
+    """Base of archive sources; names are the member paths inside the archive, flattened."""
+    extensions = []
+
+    @property
+    def output_root(self):
+        ext = _archive_extension(self.location, self.extensions)
+        return self.location[:-len(ext)] if ext else self.location + "_categorized"
+
+
+class ZipSource(ArchiveSource):
+    """
+    Images inside a ZIP archive. Listing only reads the central directory; payloads
+    are read in member offset order, a single sequential pass over the file.
+    """
+    extensions = ZIP_EXTENSIONS
+
+    def _infos(self, archive):
+        """{flat name: ZipInfo} of the image members that are safe to write out."""
+        return dict(_flat_members(self.location, ((info.filename, info) for info in archive.infolist()
+                                                  if not info.is_dir() and is_image_file(info.filename))))
+
+    def list_files(self):
+        with zipfile.ZipFile(self.location) as archive:
+            return [(name, info.file_size, int(time.mktime(info.date_time + (0, 0, -1)) * 1e9))
+                    for name, info in self._infos(archive).items()]
+
+    def iter_payloads(self, names):
+        return self._iter_members(names, lambda member: member.read())
+
+    def iter_headers(self, names):
+        """Only the head of each member is decompressed, up to the end of its image header."""
+        return self._iter_members(names, read_image_header)
+
+    def _iter_members(self, names, read):
+        wanted = set(names)
+        with zipfile.ZipFile(self.location) as archive:
+            infos = sorted(((name, info) for name, info in self._infos(archive).items() if name in wanted),
+                           key=lambda item: item[1].header_offset)
+            for name, info in infos:
+                try:
+                    with archive.open(info) as member:
+                        payload = read(member)
+                except (zipfile.BadZipFile, zlib.error, OSError, EOFError) as e:
+                    payload = e
+                yield name, payload
+
+
+class TarSource(ArchiveSource):
+    """
+    Images inside a (possibly compressed) TAR archive. Payloads are read in streaming
+    mode, one sequential pass with no seeking. Listing an uncompressed tar skips from
+    header to header; a compressed one has to be decompressed once to list it.
+    """
+    extensions = TAR_EXTENSIONS
+
+    def list_files(self):
+        with tarfile.open(self.location, "r:*") as archive:
+            return [(name, member.size, int(member.mtime * 1e9)) for name, member in
+                    _flat_members(self.location, self._images(archive))]
+
+    @staticmethod
+    def _images(archive):
+        return ((member.name, member) for member in archive if member.isfile() and is_image_file(member.name))
+
+    def iter_payloads(self, names):
+        return self._iter_members(names, lambda member: member.read())
+
+    def iter_headers(self, names):
+        """The rest of each member is skipped in the stream, never held in memory."""
+        return self._iter_members(names, read_image_header)
+
+    def _iter_members(self, names, read):
+        wanted = set(names)
+        with tarfile.open(self.location, "r|*") as archive:
+            try:
+                # Flat names are assigned in archive order, the same way as by list_files
+                for name, member in _flat_members(self.location, self._images(archive)):
+                    if name in wanted:
+                        payload = read(archive.extractfile(member))
+                        wanted.discard(name)
+                        yield name, payload
+            except (tarfile.TarError, zlib.error, OSError, EOFError) as e:
+                # A stream cannot be read past a corrupt block; the members not reached fail with it
+                for name in sorted(wanted):
+                    yield name, e
+
+
+class LocalObjectStore:
+    """
+    Minimal object store kept on the local disk (root/bucket/key), standing in for a
+    remote bucket: flat keys, prefix listing, whole-object reads and atomic writes.
+    """
+
+    def __init__(self, root=OBJECT_STORE_ROOT):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def list_objects(self, bucket, prefix=""):
+        """Return [(key, size, mtime_ns), ...] of the objects whose key starts with prefix."""
+        base = os.path.join(self.root, bucket)
+        objects = []
+        for dirpath, _, filenames in os.walk(os.path.join(base, *prefix.split("/")[:-1])):
+            for filename in filenames:
+                if filename.endswith(".part"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, base).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    stat = os.stat(path)
+                    objects.append((key, stat.st_size, stat.st_mtime_ns))
+        return sorted(objects)
+
+    def get_object(self, bucket, key):
+        with open(self._path(bucket, key), "rb") as f:
+            return f.read()
+
+    def put_object(self, bucket, key, data):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".part", "wb") as f:
+            f.write(data)
+        os.replace(path + ".part", path)
+
+    def copy_object(self, bucket, src_key, dst_key):
+        path = self._path(bucket, dst_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(self._path(bucket, src_key), path + ".part")
+        os.replace(path + ".part", path)
+
+    def delete_object(self, bucket, key):
+        try:
+            os.remove(self._path(bucket, key))
+        except FileNotFoundError:
+            pass
+
+
+class ObjectStoreSource(ImageSource):
+    """
+    Images under objstore://bucket/prefix. Only objects directly under the prefix are
+    images of the source, so category "folders" below it are not picked up again.
+    """
+
+    def __init__(self, location, store=None):
+        super().__init__(location.rstrip("/"))
+        bucket, _, prefix = location[len(OBJECT_STORE_SCHEME):].partition("/")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.store = store or LocalObjectStore()
+
+    def key(self, name):
+        return posixpath.join(self.prefix, name)
+
+    def list_files(self):
+        return [(key[len(self.prefix):], size, mtime) for key, size, mtime in
+                self.store.list_objects(self.bucket, self.prefix)
+                if "/" not in key[len(self.prefix):] and is_image_file(key)]
+
+    def iter_payloads(self, names):
+        for name in names:
+            try:
+                yield name, self.store.get_object(self.bucket, self.key(name))
+            except OSError as e:
+                yield name, e
+
+    def materialize(self, output_path, names, previous=(), mode="copy", boundary=None):
+        """Make the objects under output_path exactly `names`; links are copies in an object store."""
+        output = ObjectStoreSource(output_path, self.store)
+        unsafe = [name for name in set(names) | set(previous) if member_name(name) != name or "/" in name]
+        if unsafe:
+            raise ValueError(f"Refusing to write {unsafe[0]!r} outside {output_path}")
+        existing = {name: size for name, size, _ in output.list_files()}
+        sizes = {name: size for name, size, _ in self.list_files()}
+        wanted = set(names)
+        stale = [name for name in set(previous) - wanted if name in existing]
+        missing = [name for name in names if existing.get(name) != sizes.get(name)]
+        if mode == "dry-run":
+            return len(missing), len(stale)
+        for name in stale:
+            self.store.delete_object(output.bucket, output.key(name))
+        for copied, name in enumerate(missing, 1):
+            if output.bucket == self.bucket:
+                self.store.copy_object(self.bucket, self.key(name), output.key(name))
+            else:
+                self.store.put_object(output.bucket, output.key(name), self.read(name))
+            if boundary is not None and copied % MATERIALIZE_YIELD_FILES == 0:
+                boundary()
+        return len(missing), len(stale)
+
+
+def open_source(location):
+    """Pick the image source for a directory, archive path or objstore:// URI."""
+    if isinstance(location, ImageSource):
+        return location
+    if location.startswith(OBJECT_STORE_SCHEME):
+        return ObjectStoreSource(location)
+    if os.path.isfile(location):
+        if _archive_extension(location, ZIP_EXTENSIONS):
+            return ZipSource(location)
+        if _archive_extension(location, TAR_EXTENSIONS):
+            return TarSource(location)
+        raise ValueError(f"Unsupported archive: {location}")
+    return DirectorySource(location)
+
+
+def fingerprint(location):
+    """
+    Digest of a source's manifest: changes whenever an image is added, removed or
+    modified. Archives are fingerprinted by their own size and mtime, without listing them.
+    """
+    if not location.startswith(OBJECT_STORE_SCHEME) and os.path.isfile(location):
+        stat = os.stat(location)
+        manifest = [(os.path.basename(location), stat.st_size, stat.st_mtime_ns)]
+    else:
+        manifest = sorted(open_source(location).list_files())
+    return hashlib.sha1(repr(manifest).encode("utf-8")).hexdigest()
+
+
+def is_image_source(location):
+    """True if location is a directory, a supported archive or an objstore:// URI."""
+    if not location:
+        return False
+    if location.startswith(OBJECT_STORE_SCHEME):
+        return True
+    if os.path.isfile(location):
+        return bool(_archive_extension(location, ZIP_EXTENSIONS + TAR_EXTENSIONS))
+    return os.path.isdir(location)
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from photo_categorizer.config import CACHE_DIR, THUMBNAIL_SIZE, THUMBNAIL_WORKERS
+from photo_categorizer.logger import logger
+
+
+class ThumbnailCache:
+    """
+    On-disk thumbnail cache shared by the backend and the frontend.
+    Thumbnails are keyed by source path, size and modification time, so an
+    edited photo gets a fresh thumbnail while unchanged ones are never decoded twice.
+    """
+
+    def __init__(self, cache_dir=None, size=THUMBNAIL_SIZE, max_workers=THUMBNAIL_WORKERS):
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, "thumbnails")
+        self.size = size
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        self._pending = {}  # cache path -> Future, so a thumbnail is generated only once at a time
+        self._lock = threading.Lock()
+
+    def cache_path(self, image_path, size=None):
+        """Return the cache file path for an image without generating it."""
+        size = size or self.size
+        image_path = os.path.abspath(image_path)
+        stat = os.stat(image_path)
+        key = f"{image_path}|{stat.st_size}|{stat.st_mtime_ns}|{size}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".jpg")
+
+    def get(self, image_path, size=None):
+        """Return the cached thumbnail path, or None if it has not been generated yet."""
+        path = self.cache_path(image_path, size)
+        return path if os.path.exists(path) else None
+
+    def get_or_create(self, image_path, size=None):
+        """Return the cached thumbnail path, generating it in the calling thread if needed."""
+        path = self.cache_path(image_path, size)
+        if not os.path.exists(path):
+            self._generate(image_path, path, size or self.size)
+        return path
+
+    def submit(self, image_path, callback=None, size=None):
+        """
+        Generate a thumbnail in the background thread pool.
+        `callback(image_path, thumbnail_path)` runs on the worker thread once the
+        thumbnail is ready; thumbnail_path is None if generation failed.
+        """
+        path = self.cache_path(image_path, size)
+        with self._lock:
+            future = self._pending.get(path)
+            if future is None:
+                future = self._executor.submit(self._generate_once, image_path, path, size or self.size)
+                self._pending[path] = future
+
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(image_path, f.result()))
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _generate_once(self, image_path, path, size):
+        try:
+            if not os.path.exists(path):
+                self._generate(image_path, path, size)
+            return path
+        except Exception as e:
+            logger.error(f"Failed to create thumbnail for {image_path}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    @staticmethod
+    def _generate(image_path, path, size):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with Image.open(image_path) as img:
+            # Let the JPEG decoder downscale while decoding instead of decoding full size
+            img.draft("RGB", (size, size))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((size, size))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            # Write to a temp file first so readers never see a half written thumbnail
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, "JPEG", quality=85)
+        os.replace(tmp_path, path)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """Return the process wide thumbnail cache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ThumbnailCache()
+        return _default_cache